@@ -9,12 +9,33 @@ import subprocess
 import threading
 import time
 import logging
+import urllib.request
 from pathlib import Path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BACKEND_HEALTH_URL = "http://127.0.0.1:8000/health"
+# Startup loads the vector index and builds the LLM client (the embedding model loads
+# lazily on first use), which can take a while on a cold host with a large index
+BACKEND_STARTUP_TIMEOUT = float(os.getenv("BACKEND_STARTUP_TIMEOUT", 120))
+
+def wait_until_ready(process: subprocess.Popen, url: str, timeout: float) -> bool:
+    """Poll a health endpoint until it answers, the process exits, or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=0.5) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.1)
+    return False
+
 def start_fastapi_backend():
     """Start FastAPI backend in a separate thread"""
     try:
@@ -37,16 +58,17 @@ def start_fastapi_backend():
             stderr=subprocess.PIPE
         )
         
-        # Wait a moment for FastAPI to start
-        time.sleep(3)
-        
-        if process.poll() is None:
+        # Uvicorn only answers /health once the startup event has finished
+        if wait_until_ready(process, BACKEND_HEALTH_URL, BACKEND_STARTUP_TIMEOUT):
             logger.info("FastAPI backend started successfully on port 8000")
             return process
-        else:
-            stdout, stderr = process.communicate()
-            logger.error(f"FastAPI failed to start: {stderr.decode()}")
-            return None
+        
+        if process.poll() is None:
+            logger.error(f"FastAPI not ready after {BACKEND_STARTUP_TIMEOUT:.0f}s")
+            process.terminate()
+        stdout, stderr = process.communicate()
+        logger.error(f"FastAPI failed to start: {stderr.decode()}")
+        return None
             
     except Exception as e:
         logger.error(f"Error starting FastAPI backend: {e}")
@@ -63,9 +85,6 @@ def main():
         logger.error("Failed to start FastAPI backend. Exiting.")
         sys.exit(1)
     
-    # Wait a moment for backend to be ready
-    time.sleep(2)
-    
     # Import and run Streamlit
     try:
         # Change to frontend directory
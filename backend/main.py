@@ -16,13 +16,14 @@ load_dotenv()
 # FastAPI imports
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
 # Local imports
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
-from utils.document_processor import DocumentProcessor
+from utils.document_processor import DocumentProcessor, chunk_body
 from utils.vector_store import VectorStoreManager
 from utils.llm_manager import LLMManager
 
@@ -46,6 +47,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON responses (document lists, answers with sources)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Global instances
 document_processor = None
 vector_store = None
@@ -55,6 +59,9 @@ llm_manager = None
 class QuestionRequest(BaseModel):
     question: str
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+
 class SummaryRequest(BaseModel):
     summary_type: str = "full"
 
@@ -82,7 +89,9 @@ def get_components():
     if document_processor is None:
         document_processor = DocumentProcessor(
             chunk_size=int(os.getenv("CHUNK_SIZE", 1000)),
-            chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 200))
+            chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 200)),
+            separator_aware=os.getenv("CHUNK_SEPARATOR_AWARE", "false").lower() == "true",
+            extract_cache_dir=os.getenv("EXTRACT_CACHE_DIR", "./.cache/extract")
         )
     
     if vector_store is None:
@@ -147,7 +156,7 @@ async def upload_document(file: UploadFile = File(...)):
         
         try:
             # Process document with original filename preserved
-            documents = doc_processor.process_document(tmp_file_path, original_filename=file.filename)
+            documents = doc_processor.process_document_streaming(tmp_file_path, original_filename=file.filename)
             
             # Add to vector store
             vector_store.add_documents(documents)
@@ -159,13 +168,22 @@ async def upload_document(file: UploadFile = File(...)):
             }
             
         finally:
-            # Clean up temporary file
+            # Clean up temporary file (and any text cached under its one-off path)
+            if doc_processor.extract_cache is not None:
+                doc_processor.extract_cache.discard(tmp_file_path)
             os.unlink(tmp_file_path)
             
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sources(docs) -> List[Dict[str, Any]]:
+    """Source previews for an answer"""
+    # Older stores still carry the chunk text in metadata; don't send it a second time
+    return [{"content": chunk_body(doc)[:200] + "...",
+             "metadata": {key: value for key, value in doc.metadata.items() if key != 'raw_chunk'}}
+            for doc in docs]
+
 @app.post("/ask")
 async def ask_question(request: QuestionRequest):
     """Ask a question about uploaded documents"""
@@ -179,7 +197,8 @@ async def ask_question(request: QuestionRequest):
         if not relevant_docs:
             return {
                 "answer": "No relevant documents found. Please upload some documents first.",
-                "sources": []
+                "sources": [],
+                "has_context": False
             }
         
         # Combine context from relevant documents
@@ -188,18 +207,58 @@ async def ask_question(request: QuestionRequest):
         # Generate answer
         answer = llm_manager.answer_question(request.question, context)
         
-        # Prepare sources
-        sources = [{"content": doc.page_content[:200] + "...", "metadata": doc.metadata} for doc in relevant_docs]
-        
         return {
             "answer": answer,
-            "sources": sources
+            "sources": _sources(relevant_docs),
+            "has_context": True
         }
         
     except Exception as e:
         logger.error(f"Error answering question: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask-batch")
+def ask_questions(request: BatchQuestionRequest):
+    """Answer several questions at once: one batched retrieval and concurrent LLM calls.
+    
+    Answers come back in question order and, unlike /ask, are not added to conversation memory.
+    A plain def so FastAPI runs it in its threadpool - the LLM round-trips block.
+    """
+    try:
+        # Get components
+        _, vector_store, llm_manager = get_components()
+        
+        # Retrieve context for every question with a single batched search
+        relevant_docs = vector_store.similarity_search_batch(request.questions, k=4)
+        
+        # Only questions with context go to the LLM
+        pairs = [(question, "\n\n".join(doc.page_content for doc in docs))
+                 for question, docs in zip(request.questions, relevant_docs) if docs]
+        answers = iter(llm_manager.answer_questions(pairs) if pairs else [])
+        
+        results = []
+        for question, docs in zip(request.questions, relevant_docs):
+            if not docs:
+                results.append({
+                    "question": question,
+                    "answer": "No relevant documents found. Please upload some documents first.",
+                    "sources": [],
+                    "has_context": False
+                })
+            else:
+                results.append({
+                    "question": question,
+                    "answer": next(answers),
+                    "sources": _sources(docs),
+                    "has_context": True
+                })
+        
+        return {"results": results}
+        
+    except Exception as e:
+        logger.error(f"Error answering questions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/summarize")
 async def summarize_document(request: SummaryRequest):
     """Summarize provided text"""
@@ -214,7 +273,7 @@ async def summarize_document(request: SummaryRequest):
             raise HTTPException(status_code=400, detail="No documents uploaded. Please upload documents first.")
         
         # Combine all document content
-        combined_text = "\n\n".join([doc.page_content for doc in all_docs])
+        combined_text = "\n\n".join([chunk_body(doc) for doc in all_docs])
         
         # Generate summary
         summary = llm_manager.summarize_text(combined_text)
@@ -243,7 +302,7 @@ async def generate_quiz(request: QuizRequest):
             raise HTTPException(status_code=400, detail="No documents uploaded. Please upload documents first.")
         
         # Combine all document content
-        combined_text = "\n\n".join([doc.page_content for doc in all_docs])
+        combined_text = "\n\n".join([chunk_body(doc) for doc in all_docs])
         
         # Generate quiz
         quiz = llm_manager.generate_quiz(combined_text, request.num_questions)
@@ -309,20 +368,30 @@ async def replace_documents(request: ReplaceDocumentsRequest):
         errors = []
         
         if data_dir.exists():
-            for file_path in data_dir.rglob("*"):
-                if file_path.is_file() and file_path.suffix.lower() in ['.pdf', '.txt', '.docx']:
-                    try:
-                        documents = doc_processor.process_document(
-                            str(file_path), 
-                            force_reprocess=request.force_reprocess
-                        )
-                        if documents:
-                            all_new_documents.extend(documents)
-                            logger.info(f"Processed: {file_path.name} -> {len(documents)} chunks")
-                    except Exception as e:
-                        error_msg = f"Error processing {file_path.name}: {str(e)}"
-                        errors.append(error_msg)
-                        logger.error(error_msg)
+            file_paths = [
+                str(file_path) for file_path in data_dir.rglob("*")
+                if file_path.is_file() and file_path.suffix.lower() in ['.pdf', '.txt', '.docx']
+            ]
+            
+            # Forget cached text for files no longer in the data folder
+            if doc_processor.extract_cache is not None:
+                doc_processor.extract_cache.prune(file_paths)
+            
+            # Extract and chunk all files in parallel (unchanged files hit the extract cache)
+            results, failures = doc_processor.process_documents(
+                file_paths,
+                force_reprocess=request.force_reprocess
+            )
+            
+            for file_path, documents in results.items():
+                if documents:
+                    all_new_documents.extend(documents)
+                    logger.info(f"Processed: {Path(file_path).name} -> {len(documents)} chunks")
+            
+            for file_path, error in failures.items():
+                error_msg = f"Error processing {Path(file_path).name}: {error}"
+                errors.append(error_msg)
+                logger.error(error_msg)
         
         # Replace all documents at once
         success = vector_store.replace_all_documents(all_new_documents)
@@ -394,18 +463,35 @@ async def refresh_documents(request: RefreshRequest):
             errors = []
             
             if data_dir.exists():
-                for file_path in data_dir.rglob("*"):
-                    if file_path.is_file() and file_path.suffix.lower() in ['.pdf', '.txt', '.docx']:
-                        try:
-                            documents = doc_processor.process_document(str(file_path), force_reprocess=False)
-                            if documents:
-                                vector_store.add_documents(documents)
-                                processed_count += len(documents)
-                                logger.info(f"Added: {file_path.name}")
-                        except Exception as e:
-                            error_msg = f"Error processing {file_path.name}: {str(e)}"
-                            errors.append(error_msg)
-                            logger.error(error_msg)
+                file_paths = [
+                    str(file_path) for file_path in data_dir.rglob("*")
+                    if file_path.is_file() and file_path.suffix.lower() in ['.pdf', '.txt', '.docx']
+                ]
+                
+                # Extract and chunk every new file first, so the final store size is known
+                results, failures = doc_processor.process_documents(file_paths, force_reprocess=False)
+                for file_path, error in failures.items():
+                    error_msg = f"Error processing {Path(file_path).name}: {error}"
+                    errors.append(error_msg)
+                    logger.error(error_msg)
+                
+                # Lets FAISS size the index for the whole refresh instead of regrowing per file
+                total_hint = vector_store.get_document_count() + sum(map(len, results.values()))
+                for file_path, documents in results.items():
+                    if not documents:
+                        continue
+                    try:
+                        # Persist once after the loop rather than per file
+                        vector_store.add_documents(documents, persist=False, total_hint=total_hint)
+                        processed_count += len(documents)
+                        logger.info(f"Added: {Path(file_path).name}")
+                    except Exception as e:
+                        error_msg = f"Error processing {Path(file_path).name}: {str(e)}"
+                        errors.append(error_msg)
+                        logger.error(error_msg)
+            
+            if processed_count:
+                vector_store.save()
             
             return {
                 "message": "Document refresh completed (additive)",
@@ -497,12 +583,9 @@ async def list_documents():
         # Get components
         _, vector_store, _ = get_components()
         
-        # Get all documents
-        all_docs = vector_store.get_all_documents()
-        
         # Group by document_id to avoid showing individual chunks
         documents_info = {}
-        for doc in all_docs:
+        for doc in vector_store.iter_documents():
             doc_id = doc.metadata.get('document_id', 'unknown')
             
             if doc_id not in documents_info:
@@ -522,7 +605,7 @@ async def list_documents():
         return {
             "documents": list(documents_info.values()),
             "total_unique_documents": len(documents_info),
-            "total_chunks": len(all_docs)
+            "total_chunks": sum(info['chunks_found'] for info in documents_info.values())
         }
         
     except Exception as e:
@@ -4,10 +4,14 @@ Interactive UI for document upload, Q&A, and quiz generation
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import requests
 import json
 import time
-from typing import List, Dict, Any
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Tuple
 import os
 
 # Configure page
@@ -20,12 +24,107 @@ st.set_page_config(
 
 # API Configuration
 API_BASE_URL = "http://localhost:8000"
+# Keep bulk upload concurrency modest - the backend is a single FastAPI process
+MAX_UPLOAD_WORKERS = 8
+
+# Interaction modes shown in the sidebar
+MODES = ("chat", "quiz", "summary", "documents")
+MODE_INDEX = {mode: i for i, mode in enumerate(MODES)}
+
+# Number of chat messages rendered per rerun (and added by "Show earlier messages")
+CHAT_WINDOW_SIZE = 20
+
+@st.cache_resource
+def _api_session() -> requests.Session:
+    """Shared HTTP session, kept across reruns so its keep-alive connections are reused"""
+    session = requests.Session()
+    # Size the keep-alive pool so concurrent panel fetches and bulk uploads
+    # each get a reusable connection rather than opening throwaway ones
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_UPLOAD_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+        "User-Agent": "StudyMateBot/1.0"
+    })
+    return session
+
+@st.cache_data(ttl=10, show_spinner=False)
+def _api_healthy(url: str) -> bool:
+    """Probe the API health endpoint (cached briefly so reruns skip the round-trip)"""
+    try:
+        response = requests.get(f"{url}/health", timeout=5)
+        return response.status_code == 200
+    except:
+        return False
+
+def _request_json(session: requests.Session, method: str, url: str, action: str, **kwargs) -> Dict[str, Any]:
+    """Issue an API request and return its JSON body, or an {"error": ...} dict"""
+    try:
+        response = session.request(method, url, **kwargs)
+        if response.status_code == 200:
+            return response.json()
+        return {"error": f"{action} failed: {response.text}"}
+    except Exception as e:
+        return {"error": f"{action} error: {str(e)}"}
+
+def api_call(method: str, path: str, action: str, invalidates_documents: bool = False):
+    """Turn a method that builds request kwargs (json=, files=, ...) into a full API call"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            request_kwargs = func(self, *args, **kwargs) or {}
+            result = _request_json(self.session, method, f"{self.api_url}{path}", action, **request_kwargs)
+            if invalidates_documents and "error" not in result:
+                self.invalidate_document_cache()
+            return result
+        return wrapper
+    return decorator
+
+def _script_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool whose workers carry this script run's context, so Streamlit calls in them don't warn"""
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(max_workers=max_workers,
+                              initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+class _DocsVersion:
+    """Monotonic counter bumped whenever the (server-wide) document set changes"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+    
+    def bump(self) -> int:
+        with self._lock:
+            self.value += 1
+            return self.value
+
+@st.cache_resource
+def _docs_version() -> _DocsVersion:
+    """Shared across sessions (the backend store is shared) and safe to bump from worker threads"""
+    return _DocsVersion()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _store_stats_cached(api_url: str, docs_version: int, _session: requests.Session) -> Dict[str, Any]:
+    """Fetch vector store statistics (a new docs_version is a cache miss)"""
+    return _request_json(_session, "GET", f"{api_url}/store-stats", "Stats")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _list_documents_cached(api_url: str, docs_version: int, _session: requests.Session) -> Dict[str, Any]:
+    """Fetch the document list (a new docs_version is a cache miss)"""
+    docs = _request_json(_session, "GET", f"{api_url}/list-documents", "List")
+    # Casefold filenames once per fetch so search filtering doesn't redo it every rerun
+    for doc in docs.get("documents") or []:
+        doc["_filename_cf"] = doc["filename"].casefold()
+    return docs
 
 class StudyMateBot:
     """Main application class"""
     
     def __init__(self):
         self.api_url = API_BASE_URL
+        self.session = _api_session()
         self.initialize_session_state()
     
     def initialize_session_state(self):
@@ -43,127 +142,105 @@ class StudyMateBot:
         if "show_doc_manager" not in st.session_state:
             st.session_state.show_doc_manager = False
         if "selected_documents" not in st.session_state:
-            st.session_state.selected_documents = set()
+            # document_id -> True, kept in insertion order so selections list in UI order
+            st.session_state.selected_documents = {}
+        if "chat_window" not in st.session_state:
+            st.session_state.chat_window = CHAT_WINDOW_SIZE
     
     def check_api_health(self) -> bool:
         """Check if API is running"""
-        try:
-            response = requests.get(f"{self.api_url}/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+        healthy = _api_healthy(self.api_url)
+        if not healthy:
+            # Don't keep a negative verdict around; re-probe on the next rerun
+            _api_healthy.clear()
+        return healthy
+    
+    @api_call("POST", "/upload", "Upload", invalidates_documents=True)
+    def _post_upload(self, filename: str, content, content_type: str) -> Dict[str, Any]:
+        """POST a single file to the upload endpoint (content may be bytes or a memoryview)"""
+        return {"files": {"file": (filename, content, content_type)}, "data": {"mode": "add"}}
     
     def upload_document(self, file) -> Dict[str, Any]:
         """Upload document to API"""
-        try:
-            files = {"file": (file.name, file.getvalue(), file.type)}
-            data = {"mode": "add"}
-            response = requests.post(f"{self.api_url}/upload", files=files, data=data)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Upload failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Upload error: {str(e)}"}
+        return self._post_upload(file.name, file.getbuffer(), file.type)
     
+    @api_call("POST", "/ask", "Question")
     def ask_question(self, question: str, num_sources: int = 4) -> Dict[str, Any]:
         """Ask question to API"""
-        try:
-            payload = {
-                "question": question,
-                "num_sources": num_sources
-            }
-            response = requests.post(f"{self.api_url}/ask", json=payload)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Question failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Question error: {str(e)}"}
+        return {"json": {"question": question, "num_sources": num_sources}}
     
+    @api_call("POST", "/ask-batch", "Questions")
+    def ask_questions(self, questions: List[str]) -> Dict[str, Any]:
+        """Ask several questions to API in one request"""
+        return {"json": {"questions": questions}}
+    
+    @api_call("POST", "/summarize", "Summary")
     def generate_summary(self, summary_type: str = "full") -> Dict[str, Any]:
         """Generate summary from API"""
-        try:
-            payload = {"summary_type": summary_type}
-            response = requests.post(f"{self.api_url}/summarize", json=payload)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Summary failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Summary error: {str(e)}"}
+        return {"json": {"summary_type": summary_type}}
     
+    @api_call("POST", "/quiz", "Quiz generation")
     def generate_quiz(self, num_questions: int = 5, quiz_type: str = "mixed") -> Dict[str, Any]:
         """Generate quiz from API"""
-        try:
-            payload = {
-                "num_questions": num_questions,
-                "quiz_type": quiz_type
-            }
-            response = requests.post(f"{self.api_url}/quiz", json=payload)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Quiz generation failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Quiz error: {str(e)}"}
+        return {"json": {"num_questions": num_questions, "quiz_type": quiz_type}}
     
     def clear_memory(self) -> bool:
         """Clear conversation memory only"""
-        try:
-            response = requests.delete(f"{self.api_url}/clear-memory")
-            return response.status_code == 200
-        except:
-            return False
+        result = _request_json(self.session, "DELETE", f"{self.api_url}/clear-memory", "Clear memory")
+        return "error" not in result
     
+    @api_call("DELETE", "/clear-documents", "Clear", invalidates_documents=True)
     def clear_all_documents(self) -> Dict[str, Any]:
         """Clear all documents and reset RAG memory completely"""
-        try:
-            response = requests.delete(f"{self.api_url}/clear-documents")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Clear failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Clear error: {str(e)}"}
     
+    @api_call("POST", "/replace-documents", "Replace", invalidates_documents=True)
     def replace_all_documents(self) -> Dict[str, Any]:
         """Replace all documents with new ones from data folder"""
-        try:
-            payload = {"force_reprocess": True}
-            response = requests.post(f"{self.api_url}/replace-documents", json=payload)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Replace failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Replace error: {str(e)}"}
+        return {"json": {"force_reprocess": True}}
     
     def get_store_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
-        try:
-            response = requests.get(f"{self.api_url}/store-stats")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Stats failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Stats error: {str(e)}"}
+        stats = _store_stats_cached(self.api_url, _docs_version().value, self.session)
+        if "error" in stats:
+            _store_stats_cached.clear()
+        return stats
     
     def list_documents(self) -> Dict[str, Any]:
         """List all documents in memory"""
-        try:
-            response = requests.get(f"{self.api_url}/list-documents")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"List failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"List error: {str(e)}"}
+        docs = _list_documents_cached(self.api_url, _docs_version().value, self.session)
+        if "error" in docs:
+            _list_documents_cached.clear()
+        return docs
+    
+    def invalidate_document_cache(self):
+        """Bump the docs version so the next stats/listing fetch misses the cache"""
+        _docs_version().bump()
+    
+    def get_memory_status(self) -> Dict[str, Any]:
+        """Get store statistics and document list concurrently"""
+        # Version lookup and cache clearing stay on the script thread; workers only fetch
+        docs_version = _docs_version().value
+        with _script_thread_pool(max_workers=2) as executor:
+            stats_future = executor.submit(_store_stats_cached, self.api_url, docs_version, self.session)
+            docs_future = executor.submit(_list_documents_cached, self.api_url, docs_version, self.session)
+            status = {"stats": stats_future.result(), "documents": docs_future.result()}
+        if "error" in status["stats"]:
+            _store_stats_cached.clear()
+        if "error" in status["documents"]:
+            _list_documents_cached.clear()
+        return status
+    
+    def reset_all_memory(self) -> Dict[str, Any]:
+        """Clear all documents and conversation memory concurrently"""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            doc_future = executor.submit(_request_json, self.session, "DELETE",
+                                         f"{self.api_url}/clear-documents", "Clear")
+            memory_future = executor.submit(_request_json, self.session, "DELETE",
+                                            f"{self.api_url}/clear-memory", "Clear memory")
+            documents, memory = doc_future.result(), memory_future.result()
+        if "error" not in documents:
+            self.invalidate_document_cache()
+        return {"documents": documents, "memory_cleared": "error" not in memory}
     
     def test_memory_reset(self, test_queries: List[str] = None) -> Dict[str, Any]:
         """Test that memory has been properly reset"""
@@ -172,68 +249,82 @@ class StudyMateBot:
         
         results = {"queries_tested": [], "memory_clean": True}
         
-        for query in test_queries:
-            try:
-                response = self.ask_question(query)
-                if "error" not in response:
+        if not test_queries:
+            return results
+        
+        # Fire all test queries at once instead of waiting on each answer in turn
+        with ThreadPoolExecutor(max_workers=len(test_queries)) as executor:
+            futures = {executor.submit(self.ask_question, query): i for i, query in enumerate(test_queries)}
+            responses = [None] * len(test_queries)
+            for future in as_completed(futures):
+                try:
+                    responses[futures[future]] = future.result()
+                except Exception as e:
+                    responses[futures[future]] = e
+        
+        for query, response in zip(test_queries, responses):
+            if isinstance(response, Exception):
+                results["queries_tested"].append({
+                    "query": query,
+                    "error": str(response),
+                    "is_clean": False
+                })
+                results["memory_clean"] = False
+            elif "error" not in response:
+                sources = response.get("sources", [])
+                
+                # Check if it correctly shows no information
+                if "has_context" in response:
+                    has_no_info = response["has_context"] is False
+                else:
+                    # Older backends don't flag retrieval hits; fall back to scanning the answer
                     answer = response.get("answer", "").lower()
-                    sources = response.get("sources", [])
-                    
-                    # Check if it correctly shows no information
                     has_no_info = ("no information" in answer or 
                                  "cannot answer" in answer or 
                                  "no relevant documents" in answer)
-                    
-                    has_no_sources = not sources or all(not src.get("content", "").strip() for src in sources)
-                    
-                    results["queries_tested"].append({
-                        "query": query,
-                        "clean_answer": has_no_info,
-                        "clean_sources": has_no_sources,
-                        "is_clean": has_no_info and has_no_sources
-                    })
-                    
-                    if not (has_no_info and has_no_sources):
-                        results["memory_clean"] = False
-                        
-            except Exception as e:
+                
+                has_no_sources = not sources or all(not src.get("content", "").strip() for src in sources)
+                
                 results["queries_tested"].append({
                     "query": query,
-                    "error": str(e),
-                    "is_clean": False
+                    "clean_answer": has_no_info,
+                    "clean_sources": has_no_sources,
+                    "is_clean": has_no_info and has_no_sources
                 })
-                results["memory_clean"] = False
+                
+                if not (has_no_info and has_no_sources):
+                    results["memory_clean"] = False
         
         return results
 
+    @api_call("POST", "/remove-documents", "Remove", invalidates_documents=True)
     def remove_specific_documents(self, document_ids: List[str]) -> Dict[str, Any]:
         """Remove specific documents by their IDs"""
-        try:
-            # For now, we'll implement this as a clear + reload without the specified docs
-            # In a full implementation, you'd have a specific endpoint for this
-            payload = {"document_ids": document_ids}
-            response = requests.post(f"{self.api_url}/remove-documents", json=payload)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Remove failed: {response.text}"}
-        except Exception as e:
-            # Fallback: just return error for now since endpoint doesn't exist yet
-            return {"error": f"Document removal not implemented yet: {str(e)}"}
+        # Note: the backend does not expose /remove-documents yet, so this reports an error
+        return {"json": {"document_ids": document_ids}}
+    
+    @api_call("POST", "/create-backup", "Backup")
+    def create_backup(self, backup_name: str = None) -> Dict[str, Any]:
+        """Create a backup of the current vector store"""
+        return {"json": {"backup_name": backup_name}}
     
     def upload_and_add_document(self, file) -> Dict[str, Any]:
         """Upload document and add to existing collection without clearing"""
-        try:
-            files = {"file": (file.name, file.getvalue(), file.type)}
-            data = {"mode": "add"}
-            response = requests.post(f"{self.api_url}/upload", files=files, data=data)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Upload failed: {response.text}"}
-        except Exception as e:
-            return {"error": f"Upload error: {str(e)}"}
+        return self._post_upload(file.name, file.getbuffer(), file.type)
+    
+    def upload_documents(self, files) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Upload several documents concurrently, yielding (filename, result) as each finishes"""
+        # Snapshot up front - UploadedFile objects aren't safe to share across threads,
+        # but zero-copy views of their buffers are
+        snapshots = [(file.name, file.getbuffer(), file.type) for file in files]
+        if not snapshots:
+            return
+        
+        # _post_upload bumps the cached docs version, so its workers need the script context
+        with _script_thread_pool(max_workers=min(MAX_UPLOAD_WORKERS, len(snapshots))) as executor:
+            futures = {executor.submit(self._post_upload, *snapshot): snapshot[0] for snapshot in snapshots}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
 
 def main():
     """Main application"""
@@ -258,8 +349,8 @@ def main():
         # Mode selection
         mode = st.radio(
             "Select Mode:",
-            ["chat", "quiz", "summary", "documents"],
-            index=["chat", "quiz", "summary", "documents"].index(st.session_state.current_mode),
+            MODES,
+            index=MODE_INDEX[st.session_state.current_mode],
             help="Choose your interaction mode"
         )
         st.session_state.current_mode = mode
@@ -316,42 +407,56 @@ def main():
                     
                     with col1:
                         if st.button("✅ Select All", key="select_all_docs"):
-                            st.session_state.selected_documents = {doc["document_id"] for doc in current_docs}
+                            st.session_state.selected_documents = {doc["document_id"]: True for doc in current_docs}
+                            # Drop stale checkbox state so the widgets pick up the new default
+                            for doc in current_docs:
+                                st.session_state.pop(f"select_{doc['document_id']}", None)
                             st.rerun()
                     
                     with col2:
                         if st.button("❌ Clear Selection", key="clear_selection"):
                             st.session_state.selected_documents.clear()
+                            for doc in current_docs:
+                                st.session_state.pop(f"select_{doc['document_id']}", None)
                             st.rerun()
                     
-                    # Document List with checkboxes
-                    for doc in current_docs:
-                        doc_id = doc["document_id"]
-                        filename = doc["filename"]
-                        file_type = doc["file_type"]
-                        chunks = doc["chunks_found"]
-                        
-                        col1, col2, col3 = st.columns([3, 1, 1])
-                        
-                        with col1:
-                            # Checkbox for selection
-                            is_selected = st.checkbox(
-                                f"📄 **{filename}**",
-                                value=doc_id in st.session_state.selected_documents,
-                                key=f"select_{doc_id}",
-                                help=f"Type: {file_type} | Chunks: {chunks}"
-                            )
+                    # Document List with checkboxes, batched in a form so toggling
+                    # them doesn't rerun the whole app once per click
+                    with st.form("doc_selection"):
+                        checks = {}
+                        for doc in current_docs:
+                            doc_id = doc["document_id"]
+                            filename = doc["filename"]
+                            file_type = doc["file_type"]
+                            chunks = doc["chunks_found"]
                             
-                            if is_selected:
-                                st.session_state.selected_documents.add(doc_id)
-                            else:
-                                st.session_state.selected_documents.discard(doc_id)
-                        
-                        with col2:
-                            st.caption(f"{file_type}")
+                            col1, col2, col3 = st.columns([3, 1, 1])
+                            
+                            with col1:
+                                # Checkbox for selection
+                                checks[doc_id] = st.checkbox(
+                                    f"📄 **{filename}**",
+                                    value=doc_id in st.session_state.selected_documents,
+                                    key=f"select_{doc_id}",
+                                    help=f"Type: {file_type} | Chunks: {chunks}"
+                                )
+                            
+                            with col2:
+                                st.caption(f"{file_type}")
+                            
+                            with col3:
+                                st.caption(f"{chunks} chunks")
                         
-                        with col3:
-                            st.caption(f"{chunks} chunks")
+                        submitted = st.form_submit_button("Apply Selection")
+                    
+                    if submitted:
+                        # Update the selection in place rather than rebuilding it
+                        selected = st.session_state.selected_documents
+                        for doc_id, checked in checks.items():
+                            if checked:
+                                selected[doc_id] = True
+                            else:
+                                selected.pop(doc_id, None)
                     
                     # Bulk Actions
                     if st.session_state.selected_documents:
@@ -397,8 +502,13 @@ def main():
         
         if uploaded_files:
             st.write(f"**Ready to upload {len(uploaded_files)} files:**")
-            for file in uploaded_files:
-                st.caption(f"• {file.name} ({file.size} bytes)")
+            # Reuse the preview text across reruns while the staged files are unchanged
+            preview_key = tuple((file.name, file.size) for file in uploaded_files)
+            cached_key, preview = st.session_state.get("_upload_preview", (None, None))
+            if cached_key != preview_key:
+                preview = "\n\n".join(f"• {name} ({size} bytes)" for name, size in preview_key)
+                st.session_state["_upload_preview"] = (preview_key, preview)
+            st.caption(preview)
             
             col1, col2 = st.columns(2)
             
@@ -421,20 +531,19 @@ def main():
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    for i, file in enumerate(uploaded_files):
-                        status_text.text(f"Uploading {file.name}...")
-                        result = bot.upload_and_add_document(file)
-                        
+                    status_text.text(f"Uploading {len(uploaded_files)} files...")
+                    
+                    for i, (filename, result) in enumerate(bot.upload_documents(uploaded_files)):
                         if "error" not in result:
                             success_count += 1
                             st.session_state.uploaded_files.append({
-                                "filename": file.name,
+                                "filename": filename,
                                 "chunks": result["chunks"],
                                 "status": "active"
                             })
                         else:
                             error_count += 1
-                            st.error(f"❌ Failed to upload {file.name}: {result['error']}")
+                            st.error(f"❌ Failed to upload {filename}: {result['error']}")
                         
                         progress_bar.progress((i + 1) / len(uploaded_files))
                     
@@ -460,8 +569,9 @@ def main():
         # Show current memory status
         if st.button("📊 Show Memory Status", help="View current documents and memory statistics"):
             with st.spinner("Loading memory status..."):
-                stats = bot.get_store_stats()
-                docs_list = bot.list_documents()
+                status = bot.get_memory_status()
+                stats = status["stats"]
+                docs_list = status["documents"]
                 
                 if "error" not in stats and "error" not in docs_list:
                     st.write("**Current Memory Status:**")
@@ -505,12 +615,10 @@ def main():
             # Confirmation dialog
             if st.session_state.get('confirm_reset', False):
                 with st.spinner("🧹 Performing complete memory reset..."):
-                    # Clear documents
-                    doc_result = bot.clear_all_documents()
+                    # Clear documents and chat
+                    doc_result = bot.reset_all_memory()["documents"]
                     
                     if "error" not in doc_result:
-                        # Clear chat
-                        bot.clear_memory()
                         st.session_state.messages = []
                         st.session_state.uploaded_files = []
                         
@@ -588,21 +696,41 @@ def main():
     elif mode == "documents":
         documents_interface(bot)
 
+def render_sources_markdown(sources: List[Dict[str, Any]]) -> str:
+    """Build the markdown shown in a message's Sources expander"""
+    return "\n\n".join(
+        f"**Source {i+1}:** {source_label(source)}\n\n{source['content']}"
+        for i, source in enumerate(sources)
+    )
+
+def source_label(source: Dict[str, Any]) -> str:
+    """Display label for a source, memoized on the source dict under _label"""
+    if "_label" not in source:
+        source["_label"] = source.get("metadata", {}).get("source", "Document")
+    return source["_label"]
+
 def chat_interface(bot: StudyMateBot):
     """Chat interface for Q&A"""
     st.header("Chat with Your Study Materials")
     
-    # Display chat messages
-    for message in st.session_state.messages:
+    # Display only the most recent messages so long sessions stay cheap to rerun
+    visible = st.session_state.messages[-st.session_state.chat_window:]
+    
+    if len(st.session_state.messages) > len(visible):
+        if st.button("Show earlier messages"):
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+            st.rerun()
+    
+    for message in visible:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             
             # Show sources if available
             if "sources" in message and message["sources"]:
+                if "_rendered_sources" not in message:
+                    message["_rendered_sources"] = render_sources_markdown(message["sources"])
                 with st.expander("Sources"):
-                    for i, source in enumerate(message["sources"]):
-                        st.write(f"**Source {i+1}:** {source['metadata'].get('source', 'Document')}")
-                        st.write(source["content"])
+                    st.markdown(message["_rendered_sources"])
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your study materials..."):
@@ -620,18 +748,22 @@ def chat_interface(bot: StudyMateBot):
                 if "error" not in response:
                     st.markdown(response["answer"])
                     
+                    # Label sources once, as the reply arrives
+                    for source in response["sources"]:
+                        source_label(source)
+                    
                     # Show sources
+                    rendered_sources = render_sources_markdown(response["sources"])
                     if response["sources"]:
                         with st.expander("Sources"):
-                            for i, source in enumerate(response["sources"]):
-                                st.write(f"**Source {i+1}:** {source['metadata'].get('source', 'Document')}")
-                                st.write(source["content"])
+                            st.markdown(rendered_sources)
                     
                     # Add to messages
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": response["answer"],
-                        "sources": response["sources"]
+                        "sources": response["sources"],
+                        "_rendered_sources": rendered_sources
                     })
                 else:
                     st.error(f"Error: {response['error']}")
@@ -733,14 +865,126 @@ def summary_interface(bot: StudyMateBot):
                 else:
                     st.error(f"Error: {response['error']}")
 
+@st.fragment
+def _render_doc_card(doc: Dict[str, Any], bot: StudyMateBot):
+    """Render one document card; Preview/Remove rerun only this card"""
+    removed = st.session_state.setdefault("removed_doc_ids", set())
+    
+    with st.container():
+        if doc['document_id'] in removed:
+            st.caption(f"🗑️ {doc['filename']} removed")
+            st.divider()
+            return
+        
+        col1, col2, col3 = st.columns([4, 1, 2])
+        
+        with col1:
+            st.write(f"📄 **{doc['filename']}**")
+            st.caption(f"ID: `{doc['document_id'][:12]}...`")
+        
+        with col2:
+            st.write(f"**{doc['file_type']}**")
+            st.caption(f"{doc['chunks_found']} chunks")
+        
+        with col3:
+            # Individual document actions
+            if st.button(f"🔍 Preview", key=f"preview_{doc['document_id']}"):
+                # Show document preview
+                with st.expander(f"Preview: {doc['filename']}", expanded=True):
+                    # Try to get a sample from the document
+                    sample_response = bot.ask_question(f"What is the main topic of {doc['filename']}?")
+                    if "error" not in sample_response and sample_response.get('sources'):
+                        source_content = sample_response['sources'][0]['content']
+                        st.write("**Sample content:**")
+                        st.text_area("Content preview", source_content[:500] + "..." if len(source_content) > 500 else source_content, height=100)
+                    else:
+                        st.info("Unable to load preview")
+            
+            if st.button(f"❌ Remove", key=f"remove_{doc['document_id']}"):
+                # Individual document removal
+                with st.spinner(f"Removing {doc['filename']}..."):
+                    result = bot.remove_specific_documents([doc['document_id']])
+                    if "error" not in result:
+                        # Collapse just this card; stats catch up on the next full rerun
+                        removed.add(doc['document_id'])
+                        st.rerun(scope="fragment")
+                    else:
+                        st.error(f"❌ Failed to remove: {result['error']}")
+        
+        st.divider()
+
+@st.fragment
+def _render_bulk_operations(bot: StudyMateBot):
+    """Refresh / Clear / Backup panel"""
+    st.subheader("⚡ Bulk Operations")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("🔄 Refresh All", help="Reload documents from data folder", use_container_width=True):
+            with st.spinner("Refreshing documents..."):
+                result = bot.replace_all_documents()
+                if "error" not in result:
+                    st.success(f"✅ Refreshed! {result.get('unique_documents', 0)} documents loaded")
+                    st.session_state.removed_doc_ids = set()
+                    st.rerun()
+                else:
+                    st.error(f"❌ Refresh failed: {result['error']}")
+    
+    with col2:
+        if st.button("🧹 Clear All", help="Remove all documents from memory", use_container_width=True):
+            if st.session_state.get('confirm_clear_all', False):
+                with st.spinner("Clearing all documents..."):
+                    result = bot.clear_all_documents()
+                    if "error" not in result:
+                        st.success("✅ All documents cleared!")
+                        st.session_state.confirm_clear_all = False
+                        st.session_state.removed_doc_ids = set()
+                        st.rerun()
+                    else:
+                        st.error(f"❌ Clear failed: {result['error']}")
+            else:
+                st.session_state.confirm_clear_all = True
+                st.warning("⚠️ Click again to confirm clearing all documents")
+    
+    with col3:
+        if st.button("💾 Create Backup", help="Create backup of current documents", use_container_width=True):
+            with st.spinner("Creating backup..."):
+                result = bot.create_backup()
+                if "error" not in result:
+                    backup_name = result.get('backup_name', 'Unknown')
+                    st.success(f"✅ Backup created: {backup_name}")
+                else:
+                    st.error(f"❌ Backup failed: {result['error']}")
+
+@st.fragment
+def _render_memory_health(bot: StudyMateBot):
+    """Memory health check panel"""
+    st.subheader("🩺 Memory Health Check")
+    
+    if st.button("🧪 Test Memory", help="Test if old content has been properly cleared"):
+        with st.spinner("Testing memory for old content..."):
+            test_result = bot.test_memory_reset()
+            
+            if test_result.get("memory_clean", True):
+                st.success("✅ Memory is clean - no residual content detected!")
+            else:
+                st.warning("⚠️ Some old content may still be present")
+                
+                with st.expander("🔍 Test Details"):
+                    for test in test_result.get("queries_tested", []):
+                        status = "✅" if test.get("is_clean", False) else "⚠️"
+                        st.write(f"{status} **'{test['query']}'**: {'Clean' if test.get('is_clean', False) else 'Has residual content'}")
+
 def documents_interface(bot: StudyMateBot):
     """Comprehensive Documents Management Interface"""
     st.header("📁 Document Management Center")
     
     # Quick stats
     with st.spinner("Loading document statistics..."):
-        stats = bot.get_store_stats()
-        docs_list = bot.list_documents()
+        status = bot.get_memory_status()
+        stats = status["stats"]
+        docs_list = status["documents"]
     
     if "error" not in stats and "error" not in docs_list:
         # Statistics Dashboard
@@ -784,55 +1028,20 @@ def documents_interface(bot: StudyMateBot):
             with col2:
                 file_type_filter = st.selectbox("📄 Filter by type", ["All"] + list(stats.get('file_types', {}).keys()))
             
-            # Filter documents
-            filtered_docs = docs_list['documents']
-            
-            if search_term:
-                filtered_docs = [doc for doc in filtered_docs if search_term.lower() in doc['filename'].lower()]
-            
-            if file_type_filter != "All":
-                filtered_docs = [doc for doc in filtered_docs if doc['file_type'] == file_type_filter]
+            # Filter documents in a single pass
+            search_cf = search_term.casefold()
+            any_type = file_type_filter == "All"
+            filtered_docs = [
+                doc for doc in docs_list['documents']
+                if (any_type or doc['file_type'] == file_type_filter)
+                and (not search_cf or search_cf in doc['_filename_cf'])
+            ]
             
             st.write(f"**Showing {len(filtered_docs)} of {len(docs_list['documents'])} documents**")
             
-            # Document cards
+            # Document cards (each a fragment, so its buttons only rerun that card)
             for doc in filtered_docs:
-                with st.container():
-                    col1, col2, col3 = st.columns([4, 1, 2])
-                    
-                    with col1:
-                        st.write(f"📄 **{doc['filename']}**")
-                        st.caption(f"ID: `{doc['document_id'][:12]}...`")
-                    
-                    with col2:
-                        st.write(f"**{doc['file_type']}**")
-                        st.caption(f"{doc['chunks_found']} chunks")
-                    
-                    with col3:
-                        # Individual document actions
-                        if st.button(f"🔍 Preview", key=f"preview_{doc['document_id']}"):
-                            # Show document preview
-                            with st.expander(f"Preview: {doc['filename']}", expanded=True):
-                                # Try to get a sample from the document
-                                sample_response = bot.ask_question(f"What is the main topic of {doc['filename']}?")
-                                if "error" not in sample_response and sample_response.get('sources'):
-                                    source_content = sample_response['sources'][0]['content']
-                                    st.write("**Sample content:**")
-                                    st.text_area("Content preview", source_content[:500] + "..." if len(source_content) > 500 else source_content, height=100)
-                                else:
-                                    st.info("Unable to load preview")
-                        
-                        if st.button(f"❌ Remove", key=f"remove_{doc['document_id']}"):
-                            # Individual document removal
-                            with st.spinner(f"Removing {doc['filename']}..."):
-                                result = bot.remove_specific_documents([doc['document_id']])
-                                if "error" not in result:
-                                    st.success(f"✅ Removed {doc['filename']}")
-                                    st.rerun()
-                                else:
-                                    st.error(f"❌ Failed to remove: {result['error']}")
-                    
-                    st.divider()
+                _render_doc_card(doc, bot)
         else:
             # Empty state
             st.info("📭 No documents found")
@@ -845,63 +1054,8 @@ def documents_interface(bot: StudyMateBot):
         
         st.divider()
         
-        # Bulk Operations
-        st.subheader("⚡ Bulk Operations")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if st.button("🔄 Refresh All", help="Reload documents from data folder", use_container_width=True):
-                with st.spinner("Refreshing documents..."):
-                    result = bot.replace_all_documents()
-                    if "error" not in result:
-                        st.success(f"✅ Refreshed! {result.get('unique_documents', 0)} documents loaded")
-                        st.rerun()
-                    else:
-                        st.error(f"❌ Refresh failed: {result['error']}")
-        
-        with col2:
-            if st.button("🧹 Clear All", help="Remove all documents from memory", use_container_width=True):
-                if st.session_state.get('confirm_clear_all', False):
-                    with st.spinner("Clearing all documents..."):
-                        result = bot.clear_all_documents()
-                        if "error" not in result:
-                            st.success("✅ All documents cleared!")
-                            st.session_state.confirm_clear_all = False
-                            st.rerun()
-                        else:
-                            st.error(f"❌ Clear failed: {result['error']}")
-                else:
-                    st.session_state.confirm_clear_all = True
-                    st.warning("⚠️ Click again to confirm clearing all documents")
-                    st.rerun()
-        
-        with col3:
-            if st.button("💾 Create Backup", help="Create backup of current documents", use_container_width=True):
-                with st.spinner("Creating backup..."):
-                    result = bot.create_backup()
-                    if "error" not in result:
-                        backup_name = result.get('backup_name', 'Unknown')
-                        st.success(f"✅ Backup created: {backup_name}")
-                    else:
-                        st.error(f"❌ Backup failed: {result['error']}")
-        
-        # Memory Health Check
-        st.subheader("🩺 Memory Health Check")
-        
-        if st.button("🧪 Test Memory", help="Test if old content has been properly cleared"):
-            with st.spinner("Testing memory for old content..."):
-                test_result = bot.test_memory_reset()
-                
-                if test_result.get("memory_clean", True):
-                    st.success("✅ Memory is clean - no residual content detected!")
-                else:
-                    st.warning("⚠️ Some old content may still be present")
-                    
-                    with st.expander("🔍 Test Details"):
-                        for test in test_result.get("queries_tested", []):
-                            status = "✅" if test.get("is_clean", False) else "⚠️"
-                            st.write(f"{status} **'{test['query']}'**: {'Clean' if test.get('is_clean', False) else 'Has residual content'}")
+        _render_bulk_operations(bot)
+        _render_memory_health(bot)
         
         # Reset confirmation state
         if 'confirm_clear_all' not in st.session_state:
@@ -0,0 +1,8 @@
+"""
+Shared test setup: make the repo root importable (utils/, backend/), as backend/main.py does
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
@@ -0,0 +1,149 @@
+"""
+Tests for the FastAPI endpoints
+"""
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain")
+
+from fastapi.testclient import TestClient
+from langchain.schema import Document
+
+import backend.main as main
+
+
+class FakeVectorStore:
+    def __init__(self, docs_by_question):
+        self.docs_by_question = docs_by_question
+        self.batches = []
+
+    def similarity_search_batch(self, queries, k=4):
+        self.batches.append(list(queries))
+        return [self.docs_by_question.get(query, []) for query in queries]
+
+
+class FakeLLMManager:
+    def __init__(self):
+        self.calls = []
+
+    def answer_questions(self, pairs, max_concurrency=8):
+        self.calls.append(list(pairs))
+        return [f"answer to {question}" for question, _ in pairs]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    vector_store = FakeVectorStore({
+        "What is a cell?": [Document(page_content="Cells are units of life.", metadata={"filename": "bio.txt"})],
+        "What is DNA?": [Document(page_content="DNA carries genes.", metadata={"filename": "bio.txt"}),
+                         Document(page_content="Genes are made of DNA.", metadata={"filename": "gen.txt"})],
+    })
+    llm_manager = FakeLLMManager()
+    monkeypatch.setattr(main, "document_processor", object())
+    monkeypatch.setattr(main, "vector_store", vector_store)
+    monkeypatch.setattr(main, "llm_manager", llm_manager)
+    return TestClient(main.app), vector_store, llm_manager
+
+
+def test_ask_batch_answers_in_order_with_one_llm_batch(client):
+    client, vector_store, llm_manager = client
+    questions = ["What is DNA?", "Unrelated question", "What is a cell?"]
+
+    response = client.post("/ask-batch", json={"questions": questions})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["question"] for result in results] == questions
+    assert results[0]["answer"] == "answer to What is DNA?"
+    assert results[0]["has_context"] and len(results[0]["sources"]) == 2
+    assert not results[1]["has_context"] and results[1]["sources"] == []
+    assert results[2]["answer"] == "answer to What is a cell?"
+
+    # One retrieval batch and one LLM batch, only for questions that found context
+    assert vector_store.batches == [questions]
+    assert llm_manager.calls == [[
+        ("What is DNA?", "DNA carries genes.\n\nGenes are made of DNA."),
+        ("What is a cell?", "Cells are units of life."),
+    ]]
+
+
+def test_ask_batch_skips_llm_without_context(client):
+    client, _, llm_manager = client
+
+    response = client.post("/ask-batch", json={"questions": ["Unrelated question"]})
+
+    assert response.status_code == 200
+    assert response.json()["results"][0]["has_context"] is False
+    assert llm_manager.calls == []
+
+
+class RecordingVectorStore:
+    def __init__(self, count):
+        self.count = count
+        self.adds = []
+        self.saves = 0
+
+    def get_document_count(self):
+        return self.count
+
+    def add_documents(self, documents, persist=True, total_hint=None):
+        self.adds.append((len(documents), total_hint))
+        self.count += len(documents)
+
+    def save(self):
+        self.saves += 1
+
+
+class FakeProcessor:
+    extract_cache = None
+
+    def __init__(self, chunks_per_file):
+        self.chunks_per_file = chunks_per_file
+
+    def _chunks(self, name):
+        return [Document(page_content=f"{name} {i}", metadata={"filename": name})
+                for i in range(self.chunks_per_file[name])]
+
+    def process_documents(self, file_paths, force_reprocess=False):
+        return {path: self._chunks(Path(path).name) for path in sorted(file_paths)}, {}
+
+    def process_document_streaming(self, file_path, original_filename=None):
+        return self._chunks(original_filename)
+
+
+def test_refresh_hints_the_whole_refresh_so_faiss_reserves(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / "data" / name).write_text(name)
+    monkeypatch.chdir(tmp_path)
+    vector_store = RecordingVectorStore(count=10)
+    monkeypatch.setattr(main, "document_processor", FakeProcessor({"a.txt": 3, "b.txt": 2}))
+    monkeypatch.setattr(main, "vector_store", vector_store)
+    monkeypatch.setattr(main, "llm_manager", object())
+
+    response = TestClient(main.app).post("/refresh-documents", json={"clear_existing": False})
+
+    assert response.status_code == 200
+    assert response.json()["processed_chunks"] == 5
+    assert vector_store.adds == [(3, 15), (2, 15)]
+    # add_documents only reserves when the hint is past what this batch alone brings
+    added, hint = vector_store.adds[0]
+    assert hint > 10 + added
+    assert vector_store.saves == 1
+
+
+def test_single_upload_passes_no_size_hint(monkeypatch):
+    vector_store = RecordingVectorStore(count=10)
+    monkeypatch.setattr(main, "document_processor", FakeProcessor({"notes.txt": 4}))
+    monkeypatch.setattr(main, "vector_store", vector_store)
+    monkeypatch.setattr(main, "llm_manager", object())
+
+    response = TestClient(main.app).post(
+        "/upload", files={"file": ("notes.txt", b"some notes", "text/plain")}
+    )
+
+    assert response.status_code == 200
+    assert vector_store.adds == [(4, None)]
@@ -0,0 +1,82 @@
+"""
+Tests for DocumentProcessor text extraction and duplicate detection
+"""
+
+import docx
+from docx.enum.text import WD_BREAK
+
+from utils.document_processor import DocumentProcessor, chunk_body, _FINGERPRINT_SPAN
+
+
+def _write_large_text(path, filler: str = "teh"):
+    """A text file well over twice the fingerprint span, with a marker word in the middle"""
+    half = "a" * (_FINGERPRINT_SPAN * 2)
+    path.write_text(f"{half} {filler} {half}", encoding="utf-8")
+
+
+def test_identical_file_is_skipped(tmp_path):
+    processor = DocumentProcessor()
+    file_path = tmp_path / "notes.txt"
+    _write_large_text(file_path)
+
+    assert processor.process_document(str(file_path))
+    assert processor.process_document(str(file_path)) == []
+
+
+def test_same_size_edit_in_the_middle_is_reprocessed(tmp_path):
+    processor = DocumentProcessor()
+    file_path = tmp_path / "notes.txt"
+    _write_large_text(file_path, "teh")
+    first = processor.process_document(str(file_path))
+    assert first
+
+    # Same size, same first and last 64KB - only the full-file hash can tell them apart
+    _write_large_text(file_path, "the")
+    second = processor.process_document(str(file_path))
+    assert len(second) == len(first)
+    assert second[0].metadata["content_hash"] != first[0].metadata["content_hash"]
+
+
+def test_same_size_edit_is_reprocessed_by_process_documents(tmp_path):
+    processor = DocumentProcessor()
+    file_path = tmp_path / "notes.txt"
+    _write_large_text(file_path, "teh")
+    results, errors = processor.process_documents([str(file_path)], max_workers=1)
+    assert results[str(file_path)] and not errors
+
+    _write_large_text(file_path, "the")
+    results, errors = processor.process_documents([str(file_path)], max_workers=1)
+    assert results[str(file_path)] and not errors
+
+
+def test_docx_extraction_matches_python_docx(tmp_path):
+    """Tabs, soft line breaks and page breaks come out as python-docx renders them"""
+    file_path = tmp_path / "fixture.docx"
+    document = docx.Document()
+    document.add_paragraph("Name:\tValue")
+    paragraph = document.add_paragraph("first line\nsecond line")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    paragraph.add_run("after the page break")
+    document.add_paragraph("")
+    document.add_paragraph("last paragraph")
+    document.save(file_path)
+
+    processor = DocumentProcessor()
+    expected = [p.text for p in docx.Document(str(file_path)).paragraphs]
+    assert list(processor._iter_docx_paragraphs(str(file_path))) == expected
+    assert processor.extract_text_from_docx(str(file_path)) == "\n".join(expected).strip()
+    assert "Name:\tValue" in expected
+    assert "first line\nsecond line" in expected[1]
+
+
+def test_chunk_text_is_stored_once_and_recoverable():
+    processor = DocumentProcessor(chunk_size=100, chunk_overlap=20)
+    text = " ".join(f"word{i}" for i in range(200))
+    documents = processor.chunk_text(text, {"filename": "notes.txt"})
+
+    assert documents
+    for i, doc in enumerate(documents):
+        assert "raw_chunk" not in doc.metadata
+        assert doc.page_content.startswith(f"[notes.txt > chunk {i + 1}/{len(documents)}]\n")
+        assert doc.page_content.endswith(chunk_body(doc))
+    assert chunk_body(documents[0]) == text[:100]
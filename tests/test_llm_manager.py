@@ -0,0 +1,53 @@
+"""
+Tests for batched question answering in LLMManager
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+
+from langchain.prompts import ChatPromptTemplate
+
+from utils.llm_manager import LLMManager
+
+
+class FakeLLM:
+    def __init__(self):
+        self.invoked = []
+        self.batched = []
+
+    def invoke(self, messages):
+        self.invoked.append(messages)
+        return SimpleNamespace(content=f"answer {len(self.invoked)}")
+
+    def batch(self, inputs, config=None):
+        self.batched.append((inputs, config))
+        return [SimpleNamespace(content=f"answer {i}") for i in range(len(inputs))]
+
+
+def _bare_manager() -> LLMManager:
+    """A manager with only the state answer_questions needs (no API client or memory)"""
+    manager = LLMManager.__new__(LLMManager)
+    manager.llm = FakeLLM()
+    manager._qa_chain = SimpleNamespace(prompt=ChatPromptTemplate.from_messages([("human", "{input}")]))
+    return manager
+
+
+def test_single_pair_skips_the_batch():
+    manager = _bare_manager()
+
+    assert manager.answer_questions([("What is DNA?", "DNA carries genes.")]) == ["answer 1"]
+    assert manager.llm.batched == []
+    assert "Question: What is DNA?" in manager.llm.invoked[0][0].content
+
+
+def test_several_pairs_go_out_in_one_batch():
+    manager = _bare_manager()
+    pairs = [("What is DNA?", "DNA carries genes."), ("What is a cell?", "Cells are units of life.")]
+
+    assert manager.answer_questions(pairs, max_concurrency=2) == ["answer 0", "answer 1"]
+    assert manager.llm.invoked == []
+    inputs, config = manager.llm.batched[0]
+    assert len(inputs) == 2 and config == {"max_concurrency": 2}
@@ -0,0 +1,67 @@
+"""
+Tests for FAISS index construction in VectorStoreManager
+"""
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from utils.vector_store import VectorStoreManager, FAISS_HNSW_THRESHOLD
+
+
+def _unit_vectors(count: int, dim: int = 32) -> np.ndarray:
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _bare_manager(quantization: str = "none") -> VectorStoreManager:
+    """A manager with only the state _new_faiss_index needs (no embeddings or disk store)"""
+    manager = VectorStoreManager.__new__(VectorStoreManager)
+    manager.faiss_quantization = quantization
+    return manager
+
+
+@pytest.mark.parametrize("make_index", [
+    lambda dim: faiss.IndexFlatIP(dim),
+    lambda dim: faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT),
+    lambda dim: faiss.IndexHNSWFlat(dim, 16, faiss.METRIC_INNER_PRODUCT),
+])
+def test_reserve_preallocates_without_changing_contents(make_index):
+    vectors = _unit_vectors(600)
+    index = make_index(vectors.shape[1])
+    index.train(vectors)
+    index.add(vectors[:100])
+    storage = faiss.downcast_index(index.storage) if hasattr(index, "storage") else index
+
+    VectorStoreManager._reserve_faiss(index, 600)
+    assert index.ntotal == 100
+    assert storage.codes.size() == 100 * storage.code_size
+
+    # Adds within the reservation fill it in place instead of reallocating
+    buffer = int(storage.codes.data())
+    index.add(vectors[100:])
+    assert int(storage.codes.data()) == buffer
+    _, rows = index.search(vectors[:1], 1)
+    assert rows[0, 0] == 0
+
+
+def test_total_hint_picks_hnsw_for_the_expected_size():
+    vectors = _unit_vectors(50)
+    manager = _bare_manager()
+
+    assert isinstance(manager._new_faiss_index(vectors), faiss.IndexFlatIP)
+    hinted = manager._new_faiss_index(vectors, total_hint=FAISS_HNSW_THRESHOLD)
+    assert isinstance(faiss.downcast_index(hinted), faiss.IndexHNSW)
+    assert hinted.ntotal == 50
+
+
+def test_only_ivf_indexes_count_as_memory_mapped():
+    vectors = _unit_vectors(400)
+    ivf = faiss.index_factory(vectors.shape[1], "IVF4,Flat", faiss.METRIC_INNER_PRODUCT)
+    ivf.train(vectors)
+
+    assert VectorStoreManager._is_ivf(ivf)
+    assert not VectorStoreManager._is_ivf(faiss.IndexFlatIP(vectors.shape[1]))
+    assert not VectorStoreManager._is_ivf(faiss.IndexHNSWFlat(vectors.shape[1], 16))
@@ -5,46 +5,181 @@ Handles PDF, text, and other document formats with enhanced memory management
 
 import os
 import logging
-import hashlib
+import functools
+import multiprocessing
 import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from pathlib import Path
 
-# Document processing imports
-import PyPDF2
-from docx import Document
-import tiktoken
+import xxhash
 
-# LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+# LangChain imports (the text splitter and the PDF/DOCX/tokenizer libraries are
+# imported where they are used, so importing this module stays cheap)
 from langchain.schema import Document as LangChainDocument
 
+from .extract_cache import ExtractCache
+
 logger = logging.getLogger(__name__)
 
+# Bytes read from each end of a file for its quick pre-extraction fingerprint
+_FINGERPRINT_SPAN = 64 * 1024
+# Block size for the full-file hash that confirms a fingerprint match
+_FILE_HASH_BLOCK = 1024 * 1024
+
+_WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_WORD_PARAGRAPH = f'{{{_WORD_NS}}}p'
+_WORD_T = f'{{{_WORD_NS}}}t'
+_WORD_BR = f'{{{_WORD_NS}}}br'
+_WORD_BR_TYPE = f'{{{_WORD_NS}}}type'
+# Plain-text equivalents of run elements other than w:t and w:br, as python-docx maps them
+_WORD_RUN_SYMBOLS = {
+    f'{{{_WORD_NS}}}tab': '\t',
+    f'{{{_WORD_NS}}}ptab': '\t',
+    f'{{{_WORD_NS}}}cr': '\n',
+    f'{{{_WORD_NS}}}noBreakHyphen': '-',
+}
+
+@functools.lru_cache(maxsize=None)
+def _word_paragraph_content():
+    """Compiled XPath for a paragraph's own run content (incl. hyperlinks) in document order,
+    not nested text boxes"""
+    from lxml import etree
+    content = '*[self::w:t or self::w:tab or self::w:ptab or self::w:br or self::w:cr or self::w:noBreakHyphen]'
+    return etree.XPath(f'./w:r/{content} | ./w:hyperlink/w:r/{content}', namespaces={'w': _WORD_NS})
+
+def _word_run_text(element) -> str:
+    """Text of one run content element: text for w:t, a newline for line breaks, tabs for tabs"""
+    if element.tag == _WORD_T:
+        return element.text or ''
+    if element.tag == _WORD_BR:
+        # Page and column breaks carry no text
+        return '\n' if element.get(_WORD_BR_TYPE, 'textWrapping') == 'textWrapping' else ''
+    return _WORD_RUN_SYMBOLS[element.tag]
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    """tiktoken encoding, loaded once per process (None if unavailable)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding, using estimated token counts: {e}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int):
+    """Shared separator-aware splitter, built once per (chunk_size, chunk_overlap)"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+def _sliding_window(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split text into fixed-size windows that overlap by chunk_overlap characters"""
+    if not text:
+        return []
+    step = chunk_size - chunk_overlap
+    return [text[start:start + chunk_size] for start in range(0, max(len(text) - chunk_overlap, 1), step)]
+
+def _strip_stream(pieces: Iterator[str]) -> Iterator[str]:
+    """Yield pieces whose concatenation equals "".join(pieces).strip(), without joining them"""
+    started = False
+    pending = ""
+    for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+        body = piece.rstrip()
+        if body:
+            yield pending + body
+            pending = piece[len(body):]
+        else:
+            # Hold trailing whitespace back until we know more text follows it
+            pending += piece
+
+def chunk_body(document: LangChainDocument) -> str:
+    """A chunk's text without the breadcrumb prefix that _build_documents adds for embedding"""
+    metadata = document.metadata
+    if 'raw_chunk' in metadata:
+        return metadata['raw_chunk']  # Stores built when the bare text was kept in metadata
+    return document.page_content[metadata.get('content_offset', 0):]
+
+class SlidingChunker:
+    """Incremental version of _sliding_window: feed text piece by piece, get chunks as they fill"""
+    
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.step = chunk_size - chunk_overlap
+        self.chunk_overlap = chunk_overlap
+        self._buffer = ""
+        self._emitted = False
+    
+    def feed(self, text: str) -> Iterator[str]:
+        """Add text and yield every chunk that is now complete"""
+        self._buffer += text
+        while len(self._buffer) >= self.chunk_size:
+            yield self._buffer[:self.chunk_size]
+            self._buffer = self._buffer[self.step:]
+            self._emitted = True
+    
+    def flush(self) -> Iterator[str]:
+        """Yield the final partial chunk, if it holds text not already covered by the last one"""
+        if len(self._buffer) > self.chunk_overlap or (not self._emitted and self._buffer):
+            yield self._buffer
+        self._buffer = ""
+
+def _process_one(file_path: str, chunk_size: int, chunk_overlap: int, separator_aware: bool = False,
+                 extract_cache_dir: Optional[str] = None) -> Tuple[Dict[str, Any], List[LangChainDocument]]:
+    """Process a single file in a worker process (top-level so it can be pickled)"""
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                  separator_aware=separator_aware, extract_cache_dir=extract_cache_dir)
+    documents = processor.process_document(file_path, force_reprocess=True)
+    return processor.processed_documents, documents
+
 class DocumentProcessor:
     """Handles document loading, text extraction, and memory management"""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separator_aware: bool = False,
+                 extract_cache_dir: Optional[str] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Fixed-size windows by default; the LangChain splitter only when separator-aware splitting is wanted
+        self.separator_aware = separator_aware
+        self.text_splitter = _get_text_splitter(chunk_size, chunk_overlap) if separator_aware else None
+        # Optional on-disk cache of extracted text, keyed by (path, size, mtime)
+        self.extract_cache_dir = extract_cache_dir
+        self.extract_cache = ExtractCache(extract_cache_dir) if extract_cache_dir else None
+        # Extension -> text extractor
+        self._extractors = {
+            '.pdf': self.extract_text_from_pdf,
+            '.docx': self.extract_text_from_docx,
+            '.txt': self.extract_text_from_txt
+        }
         # Track processed documents to prevent duplicates
         self.processed_documents = {}
+        # Hash-only view of processed_documents for the duplicate-check fast path
+        self._seen_hashes = set()
+        # Quick file fingerprint -> (full file hash, content hash), to skip extracting known duplicates
+        self._file_fingerprints = {}
     
-    def generate_document_id(self, file_path: str, content: str = None) -> str:
+    def generate_document_id(self, file_path: str, content: str = None, content_hash: str = None) -> str:
         """Generate unique document ID based on filename and content hash"""
         try:
             file_name = Path(file_path).name
             
-            if content:
-                # Create hash from content for uniqueness
-                content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()[:8]
+            if content_hash or content:
+                # Create hash from content for uniqueness (reuse it if the caller already has one)
+                content_hash = (content_hash or self.calculate_content_hash(content))[:8]
                 return f"{file_name}_{content_hash}"
             else:
                 # Fallback to timestamp-based ID
@@ -56,34 +191,84 @@ class DocumentProcessor:
             return str(uuid.uuid4())[:8]
     
     def calculate_content_hash(self, content: str) -> str:
-        """Calculate MD5 hash of content for duplicate detection"""
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+        """Calculate a fast non-cryptographic hash (XXH3-64) of content for duplicate detection"""
+        return self._hash_bytes(content.encode('utf-8'))
+    
+    def _hash_bytes(self, buf: bytes) -> str:
+        """Hash already-encoded content"""
+        return xxhash.xxh3_64_hexdigest(buf)
     
     def is_duplicate_document(self, content_hash: str) -> bool:
         """Check if document with this content hash was already processed"""
-        return content_hash in self.processed_documents
+        return content_hash in self._seen_hashes
+    
+    def _fast_file_fingerprint(self, file_path: str) -> str:
+        """Hash of the file size plus its first and last 64KB (the whole file when smaller)"""
+        size = os.path.getsize(file_path)
+        hasher = xxhash.xxh3_64(str(size).encode('ascii'))
+        with open(file_path, 'rb') as f:
+            hasher.update(f.read(_FINGERPRINT_SPAN))
+            if size > _FINGERPRINT_SPAN:
+                f.seek(max(_FINGERPRINT_SPAN, size - _FINGERPRINT_SPAN))
+                hasher.update(f.read())
+        return hasher.hexdigest()
+    
+    def _full_file_hash(self, file_path: str) -> str:
+        """XXH3-128 of the file's raw bytes - a full read, but far cheaper than extraction"""
+        hasher = xxhash.xxh3_128()
+        with open(file_path, 'rb') as f:
+            while block := f.read(_FILE_HASH_BLOCK):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def is_known_file(self, file_path: str, fingerprint: str) -> bool:
+        """Check whether this exact file was already processed (and still is).
+        
+        The fingerprint only samples the file, so a match is confirmed against the
+        full-file hash before the file is treated as a duplicate.
+        """
+        known = self._file_fingerprints.get(fingerprint)
+        if known is None:
+            return False
+        file_hash, content_hash = known
+        return self.is_duplicate_document(content_hash) and self._full_file_hash(file_path) == file_hash
     
     def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
+        """Extract text from PDF file (PDFium, with PyPDF2 as a fallback)"""
+        try:
+            return "".join(self._iter_pdf_pages(file_path)).strip()
+        except Exception as e:
+            logger.warning(f"PDFium could not read {file_path}, falling back to PyPDF2: {e}")
+        
         try:
+            import PyPDF2
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+                return "\n".join(page.extract_text() for page in pdf_reader.pages).strip()
         except Exception as e:
             logger.error(f"Error extracting text from PDF {file_path}: {e}")
             raise
     
+    def _iter_docx_paragraphs(self, file_path: str) -> Iterator[str]:
+        """Stream paragraph text straight out of word/document.xml"""
+        from lxml import etree
+        paragraph_content = _word_paragraph_content()
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml:
+            for _, paragraph in etree.iterparse(xml, tag=_WORD_PARAGRAPH):
+                yield "".join(map(_word_run_text, paragraph_content(paragraph)))
+                paragraph.clear()
+    
     def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
+        """Extract text from DOCX file (raw XML parse, with python-docx as a fallback)"""
+        try:
+            return "\n".join(self._iter_docx_paragraphs(file_path)).strip()
+        except Exception as e:
+            logger.warning(f"Could not parse {file_path} directly, falling back to python-docx: {e}")
+        
         try:
+            from docx import Document
             doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
         except Exception as e:
             logger.error(f"Error extracting text from DOCX {file_path}: {e}")
             raise
@@ -98,42 +283,67 @@ class DocumentProcessor:
             raise
     
     def extract_text(self, file_path: str) -> str:
+        """Extract text from various file formats (served from the extract cache when unchanged)"""
+        if self.extract_cache is not None:
+            cached = self.extract_cache.get(file_path)
+            if cached is not None:
+                return cached
+        
+        text = self._extract_text_uncached(file_path)
+        
+        if self.extract_cache is not None:
+            self.extract_cache.put(file_path, text)
+        return text
+    
+    def _extract_text_uncached(self, file_path: str) -> str:
         """Extract text from various file formats"""
         file_extension = Path(file_path).suffix.lower()
-        
-        if file_extension == '.pdf':
-            return self.extract_text_from_pdf(file_path)
-        elif file_extension == '.docx':
-            return self.extract_text_from_docx(file_path)
-        elif file_extension == '.txt':
-            return self.extract_text_from_txt(file_path)
-        else:
+        extractor = self._extractors.get(file_extension)
+        if extractor is None:
             raise ValueError(f"Unsupported file format: {file_extension}")
+        return extractor(file_path)
     
-    def chunk_text(self, text: str, metadata: Dict[str, Any] = None) -> List[LangChainDocument]:
+    def chunk_text(self, text: str, metadata: Dict[str, Any] = None,
+                   precomputed_content_hash: str = None) -> List[LangChainDocument]:
         """Split text into chunks and return as LangChain Documents with enhanced metadata"""
         if metadata is None:
             metadata = {}
         
-        # Add content hash for tracking
-        content_hash = self.calculate_content_hash(text)
+        # Add content hash for tracking (skip re-encoding the full text if the caller hashed it)
+        content_hash = precomputed_content_hash or self.calculate_content_hash(text)
         metadata['content_hash'] = content_hash
         metadata['processed_timestamp'] = datetime.now().isoformat()
         
         # Split the text
-        chunks = self.text_splitter.split_text(text)
+        if self.text_splitter is not None:
+            chunks = self.text_splitter.split_text(text)
+        else:
+            chunks = _sliding_window(text, self.chunk_size, self.chunk_overlap)
+        
+        return self._build_documents(chunks, metadata)
+    
+    def _build_documents(self, chunks: List[str], metadata: Dict[str, Any]) -> List[LangChainDocument]:
+        """Convert chunk strings to LangChain Documents carrying per-chunk metadata.
         
-        # Convert to LangChain Documents
+        Each chunk's content is prefixed with a "[filename > chunk i/n]" breadcrumb so it
+        embeds with its context; metadata['content_offset'] is the prefix length, so
+        chunk_body() can recover the bare text without storing it twice.
+        """
+        filename = metadata.get('filename', 'unknown')
+        total = len(chunks)
+        token_counts = self.get_token_counts(chunks)
         documents = []
         for i, chunk in enumerate(chunks):
+            # copy() + item assignment: no throwaway dict per chunk as with update({...})
             doc_metadata = metadata.copy()
-            doc_metadata.update({
-                'chunk_id': i,
-                'total_chunks': len(chunks),
-                'chunk_hash': self.calculate_content_hash(chunk)
-            })
+            doc_metadata['chunk_id'] = i
+            doc_metadata['total_chunks'] = total
+            doc_metadata['chunk_hash'] = self.calculate_content_hash(chunk)
+            doc_metadata['chunk_token_count'] = token_counts[i]
+            breadcrumb = f"[{filename} > chunk {i + 1}/{total}]\n"
+            doc_metadata['content_offset'] = len(breadcrumb)
             documents.append(LangChainDocument(
-                page_content=chunk,
+                page_content=breadcrumb + chunk,
                 metadata=doc_metadata
             ))
         
@@ -142,11 +352,17 @@ class DocumentProcessor:
     def process_document(self, file_path: str, force_reprocess: bool = False, original_filename: str = None) -> List[LangChainDocument]:
         """Complete document processing pipeline with duplicate detection"""
         try:
+            # Skip extraction entirely for a file we've already processed
+            fingerprint = self._fast_file_fingerprint(file_path)
+            if not force_reprocess and self.is_known_file(file_path, fingerprint):
+                logger.info(f"Document {original_filename or Path(file_path).name} already processed, skipping")
+                return []
+            
             # Extract text
             text = self.extract_text(file_path)
             
-            # Check for duplicates
-            content_hash = self.calculate_content_hash(text)
+            # Check for duplicates - encode once, reuse the hash for the ID and chunk metadata
+            content_hash = self._hash_bytes(text.encode('utf-8'))
             if not force_reprocess and self.is_duplicate_document(content_hash):
                 display_name = original_filename or Path(file_path).name
                 logger.info(f"Document {display_name} already processed, skipping")
@@ -156,32 +372,18 @@ class DocumentProcessor:
             file_name = original_filename if original_filename else Path(file_path).name
             
             # Generate unique document ID using the display name
-            document_id = self.generate_document_id(file_name, text)
+            document_id = self.generate_document_id(file_name, content_hash=content_hash)
             
             # Create enhanced metadata
-            file_stats = os.stat(file_path)
-            metadata = {
-                'source': file_path,
-                'filename': file_name,  # Use the preserved original filename
-                'file_type': Path(file_name).suffix.lower(),  # Get extension from original name
-                'document_id': document_id,
-                'content_hash': content_hash,
-                'file_size': file_stats.st_size,
-                'modification_time': datetime.fromtimestamp(file_stats.st_mtime).isoformat(),
-                'processing_timestamp': datetime.now().isoformat(),
-                'token_count': self.get_token_count(text)
-            }
+            metadata = self._build_metadata(file_path, file_name, document_id, content_hash,
+                                            self.get_token_count(text))
             
             # Chunk the text
-            documents = self.chunk_text(text, metadata)
+            documents = self.chunk_text(text, metadata, precomputed_content_hash=content_hash)
             
             # Track processed document with original filename
-            self.processed_documents[content_hash] = {
-                'document_id': document_id,
-                'filename': file_name,  # Store original filename
-                'timestamp': datetime.now().isoformat(),
-                'chunk_count': len(documents)
-            }
+            self._record_processed(content_hash, document_id, file_name, len(documents), fingerprint,
+                                   self._full_file_hash(file_path))
             
             logger.info(f"Processed {file_name}: {len(documents)} chunks created with ID {document_id}")
             return documents
@@ -191,18 +393,193 @@ class DocumentProcessor:
             logger.error(f"Error processing document {display_name}: {e}")
             raise
     
+    def _build_metadata(self, file_path: str, file_name: str, document_id: str,
+                        content_hash: str, token_count: int) -> Dict[str, Any]:
+        """Document-level metadata shared by every chunk"""
+        file_stats = os.stat(file_path)
+        return {
+            'source': file_path,
+            'filename': file_name,  # Use the preserved original filename
+            'file_type': Path(file_name).suffix.lower(),  # Get extension from original name
+            'document_id': document_id,
+            'content_hash': content_hash,
+            'file_size': file_stats.st_size,
+            'modification_time': datetime.fromtimestamp(file_stats.st_mtime).isoformat(),
+            'processing_timestamp': datetime.now().isoformat(),
+            'token_count': token_count
+        }
+    
+    def _record_processed(self, content_hash: str, document_id: str, file_name: str, chunk_count: int,
+                          fingerprint: Optional[str] = None, file_hash: Optional[str] = None):
+        """Track a processed document (by content hash) for duplicate detection"""
+        self._seen_hashes.add(content_hash)
+        self.processed_documents[content_hash] = {
+            'document_id': document_id,
+            'filename': file_name,  # Store original filename
+            'timestamp': datetime.now().isoformat(),
+            'chunk_count': chunk_count,
+            'file_fingerprint': fingerprint,
+            'file_hash': file_hash
+        }
+        if fingerprint and file_hash:
+            self._file_fingerprints[fingerprint] = (file_hash, content_hash)
+    
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """Yield PDF text one page at a time, separated by newlines (matches extract_text_from_pdf)"""
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(file_path)
+        try:
+            for i, page in enumerate(pdf):
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+                yield text if i == 0 else "\n" + text
+        finally:
+            pdf.close()
+    
+    def process_document_streaming(self, file_path: str, force_reprocess: bool = False,
+                                   original_filename: str = None) -> List[LangChainDocument]:
+        """Like process_document, but never holds the full text of a PDF in memory.
+        
+        Pages are hashed and chunked as they are extracted, so peak memory is roughly
+        one page plus the chunks. Produces the same hash and chunks as process_document.
+        Non-PDF files and separator-aware chunking go through process_document.
+        """
+        if self.separator_aware or Path(file_path).suffix.lower() != '.pdf':
+            return self.process_document(file_path, force_reprocess, original_filename)
+        
+        display_name = original_filename or Path(file_path).name
+        fingerprint = self._fast_file_fingerprint(file_path)
+        if not force_reprocess and self.is_known_file(file_path, fingerprint):
+            logger.info(f"Document {display_name} already processed, skipping")
+            return []
+        
+        try:
+            hasher = xxhash.xxh3_64()
+            chunker = SlidingChunker(self.chunk_size, self.chunk_overlap)
+            chunks = []
+            token_count = 0
+            for piece in _strip_stream(self._iter_pdf_pages(file_path)):
+                hasher.update(piece.encode('utf-8'))
+                token_count += self.get_token_count(piece)
+                chunks.extend(chunker.feed(piece))
+            chunks.extend(chunker.flush())
+        except Exception as e:
+            logger.warning(f"Streaming extraction failed for {display_name}, using full extraction: {e}")
+            return self.process_document(file_path, force_reprocess, original_filename)
+        
+        try:
+            # Chunks are only committed once the full-document hash is known
+            content_hash = hasher.hexdigest()
+            if not force_reprocess and self.is_duplicate_document(content_hash):
+                logger.info(f"Document {display_name} already processed, skipping")
+                return []
+            
+            document_id = self.generate_document_id(display_name, content_hash=content_hash)
+            metadata = self._build_metadata(file_path, display_name, document_id, content_hash, token_count)
+            metadata['processed_timestamp'] = datetime.now().isoformat()
+            documents = self._build_documents(chunks, metadata)
+            
+            self._record_processed(content_hash, document_id, display_name, len(documents), fingerprint,
+                                   self._full_file_hash(file_path))
+            
+            logger.info(f"Processed {display_name}: {len(documents)} chunks created with ID {document_id}")
+            return documents
+            
+        except Exception as e:
+            logger.error(f"Error processing document {display_name}: {e}")
+            raise
+    
+    def process_documents(self, file_paths: List[str], force_reprocess: bool = False,
+                          max_workers: Optional[int] = None) -> Tuple[Dict[str, List[LangChainDocument]], Dict[str, str]]:
+        """Process several files in parallel worker processes.
+        
+        Returns (documents by path, error message by path). Duplicate detection runs
+        here after the workers finish, against this processor's cache and the batch itself.
+        """
+        results = {}
+        errors = {}
+        if not file_paths:
+            return results, errors
+        
+        if not force_reprocess:
+            # Files we've already processed don't need a worker at all
+            pending = []
+            for file_path in file_paths:
+                try:
+                    known = self.is_known_file(file_path, self._fast_file_fingerprint(file_path))
+                except OSError:
+                    known = False  # let the worker report the error
+                if known:
+                    logger.info(f"Document {Path(file_path).name} already processed, skipping")
+                    results[file_path] = []
+                else:
+                    pending.append(file_path)
+            file_paths = pending
+            if not file_paths:
+                return results, errors
+        
+        if max_workers is None:
+            max_workers = min(os.cpu_count() or 1, len(file_paths))
+        
+        # Spawn, not fork: the API process already runs FAISS/torch and timer threads whose
+        # locks a forked child could inherit held, and a fork would copy the loaded model
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                executor.submit(_process_one, file_path, self.chunk_size, self.chunk_overlap,
+                                self.separator_aware, self.extract_cache_dir): file_path
+                for file_path in file_paths
+            }
+            outcomes = {}
+            for future, file_path in futures.items():
+                try:
+                    outcomes[file_path] = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing document {Path(file_path).name}: {e}")
+                    errors[file_path] = str(e)
+        
+        # Merge in submission order so duplicate resolution is deterministic
+        for file_path in file_paths:
+            if file_path not in outcomes:
+                continue
+            processed, documents = outcomes[file_path]
+            for content_hash, info in processed.items():
+                if not force_reprocess and self.is_duplicate_document(content_hash):
+                    logger.info(f"Document {Path(file_path).name} already processed, skipping")
+                    documents = []
+                    continue
+                self._seen_hashes.add(content_hash)
+                self.processed_documents[content_hash] = info
+                if info.get('file_fingerprint') and info.get('file_hash'):
+                    self._file_fingerprints[info['file_fingerprint']] = (info['file_hash'], content_hash)
+            results[file_path] = documents
+        
+        return results, errors
+    
     def get_token_count(self, text: str) -> int:
         """Get approximate token count for text"""
         try:
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
+            # Document text needs no special-token handling
+            return len(_get_encoding().encode_ordinary(text))
         except:
             # Fallback: rough estimate (4 characters per token)
             return len(text) // 4
     
+    def get_token_counts(self, texts: List[str]) -> List[int]:
+        """Token counts for many texts in one batched (multi-threaded) tiktoken call"""
+        try:
+            return [len(ids) for ids in _get_encoding().encode_ordinary_batch(texts)]
+        except:
+            # Fallback: rough estimate (4 characters per token)
+            return [len(text) // 4 for text in texts]
+    
     def clear_processed_cache(self):
         """Clear the processed documents cache"""
         self.processed_documents.clear()
+        self._seen_hashes.clear()
+        self._file_fingerprints.clear()
         logger.info("Cleared processed documents cache")
     
     def get_processed_documents_info(self) -> Dict[str, Any]:
@@ -212,5 +589,10 @@ class DocumentProcessor:
     def remove_from_processed_cache(self, content_hash: str):
         """Remove a document from processed cache"""
         if content_hash in self.processed_documents:
-            del self.processed_documents[content_hash]
+            info = self.processed_documents.pop(content_hash)
+            self._seen_hashes.discard(content_hash)
+            known = self._file_fingerprints.get(info.get('file_fingerprint'))
+            # Another version of the file may share the fingerprint; only drop our own entry
+            if known is not None and known[1] == content_hash:
+                del self._file_fingerprints[info['file_fingerprint']]
             logger.info(f"Removed document with hash {content_hash} from cache")
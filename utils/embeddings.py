@@ -1,89 +1,242 @@
 # utils/embeddings.py
 import os
-import hashlib
+import atexit
+import contextlib
 import pickle
-from typing import List
+import threading
+from typing import Iterator, List, Optional
 import numpy as np
+import xxhash
 
 # Local embedding model
+import torch
 from sentence_transformers import SentenceTransformer
 
 # Constants come from environment with sensible defaults
 CACHE_PATH = os.getenv("EMBEDDINGS_CACHE_PATH", "data/embeddings_cache.pkl")
+# New embeddings are appended here and folded into CACHE_PATH on the next load
+CACHE_LOG_PATH = CACHE_PATH + ".log"
 HF_MODEL = os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local").lower()
+# Texts per forward pass in the multi-process pool (in-process encoding uses EMBED_TOKEN_BUDGET)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 128))
+
+# bfloat16 autocast on CPU only pays off on CPUs with native BF16 (AVX512-BF16/AMX), so opt-in
+EMBED_CPU_BF16 = os.getenv("EMBED_CPU_BF16", "false").lower() == "true"
+
+# Padded tokens per forward pass (batch size x longest text); bounds memory for long chunks
+EMBED_TOKEN_BUDGET = int(os.getenv("EMBED_TOKEN_BUDGET", 32768))
+
+# CPU batches at least this large are spread over a pool of worker processes
+EMBED_POOL_THRESHOLD = int(os.getenv("EMBED_POOL_THRESHOLD", 256))
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+
+# One model per process, shared by every EmbeddingService / LocalEmbeddings instance
+_HF_MODEL: Optional[SentenceTransformer] = None
+_HF_MODEL_LOCK = threading.Lock()
+_HF_POOL = None
+
+def _get_hf_model() -> SentenceTransformer:
+    """Load the SentenceTransformer once (on GPU if available) and reuse it"""
+    global _HF_MODEL
+    if _HF_MODEL is None:
+        with _HF_MODEL_LOCK:
+            if _HF_MODEL is None:
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+                model = SentenceTransformer(HF_MODEL, device=device)
+                model.eval()
+                if device == "cuda":
+                    # FP16 halves matmul width on GPU; similarity drift is negligible for MiniLM
+                    model.half()
+                _HF_MODEL = model
+    return _HF_MODEL
+
+def _get_hf_pool():
+    """Start the multi-process encode pool on first use; stopped at interpreter exit"""
+    global _HF_POOL
+    if _HF_POOL is None:
+        model = _get_hf_model()  # outside the lock: it takes the lock itself
+        with _HF_MODEL_LOCK:
+            if _HF_POOL is None:
+                _HF_POOL = model.start_multi_process_pool(target_devices=["cpu"] * EMBED_POOL_WORKERS)
+                atexit.register(model.stop_multi_process_pool, _HF_POOL)
+    return _HF_POOL
+
+def _l2_normalize(vecs: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length in place (zero rows are left alone)"""
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    np.divide(vecs, norms, out=vecs, where=norms > 0)
+    return vecs
+
+def _token_budget_batches(texts: List[str], max_seq_length: int) -> Iterator[List[int]]:
+    """Yield index batches in ascending length, each within EMBED_TOKEN_BUDGET padded tokens.
+    
+    Token counts are estimated at ~4 characters per token and capped at the model's
+    max_seq_length (longer texts are truncated by the model anyway).
+    """
+    lengths = [min(max_seq_length, len(t) // 4 + 2) for t in texts]
+    batch: List[int] = []
+    for i in sorted(range(len(texts)), key=lengths.__getitem__):
+        # Sorted ascending, so text i is the longest in the batch it joins
+        if batch and (len(batch) + 1) * lengths[i] > EMBED_TOKEN_BUDGET:
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
 
 class EmbeddingService:
     """
     Simple embedding service with a persistent disk cache.
-    Default provider is local SentenceTransformer.
-    Returns list[np.ndarray(dtype=float32)] for given texts.
+    Default provider is local SentenceTransformer. Vectors are L2-normalized, so
+    inner product equals cosine similarity.
+    Returns an (n_texts, dim) float32 matrix for given texts.
     """
 
     def __init__(self):
-        self.cache = self._load_cache()
+        # Cache: one (rows, dim) float32 matrix plus text hash -> row index.
+        # Rows [0, self._size) are filled; the rest is preallocated headroom.
+        self._index, self._vecs, self._size = {}, None, 0
+        self._load_cache()
         self.hf_model = None
         if PROVIDER == "local":
             self._init_hf()
 
-    def _hash(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    def _hash(self, text: str) -> bytes:
+        # 128-bit XXH3: non-cryptographic but collision-safe for cache keys, raw bytes as dict key
+        return xxhash.xxh3_128_digest(text.encode("utf-8"))
+
+    def _hash_all(self, texts: List[str]) -> List[bytes]:
+        """Hash a whole batch in one comprehension (no per-text method dispatch)"""
+        digest = xxhash.xxh3_128_digest
+        return [digest(t.encode("utf-8")) for t in texts]
 
     def _load_cache(self):
         try:
             if os.path.exists(CACHE_PATH):
                 with open(CACHE_PATH, "rb") as f:
-                    return pickle.load(f)
+                    cache = pickle.load(f)
+                # Caches keyed by older (SHA-256 hex) hashes can't be looked up; start fresh
+                if "vecs" in cache and "index" in cache and \
+                        all(isinstance(h, bytes) for h in cache["index"]):
+                    self._index, self._vecs = cache["index"], cache["vecs"]
+                    self._size = len(self._vecs)
+                    if not cache.get("normalized"):
+                        # Written before vectors were stored unit-length
+                        _l2_normalize(self._vecs)
         except Exception:
             # If cache is corrupt, ignore and start fresh
             pass
-        return {}
+
+        if self._replay_log():
+            # Fold the log into the snapshot so it doesn't grow without bound
+            self._save_cache()
+
+    def _replay_log(self) -> bool:
+        """Apply (hashes, vectors) batches appended since the last snapshot; True if any"""
+        if not os.path.exists(CACHE_LOG_PATH):
+            return False
+        replayed = False
+        with open(CACHE_LOG_PATH, "rb") as f:
+            while True:
+                try:
+                    hashes, vecs = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    # A torn final record from an interrupted write; keep what came before
+                    break
+                # Normalizing is idempotent, and covers records from before normalization
+                start = self._append_rows(_l2_normalize(vecs))
+                for offset, h in enumerate(hashes):
+                    self._index[h] = start + offset
+                replayed = True
+        return replayed
 
     def _save_cache(self):
+        """Write a full snapshot and drop the append log it now contains"""
         os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
-        with open(CACHE_PATH, "wb") as f:
-            pickle.dump(self.cache, f)
+        tmp_path = CACHE_PATH + ".tmp"
+        with open(tmp_path, "wb") as f:
+            # Protocol 5 pickles the matrix as one raw buffer (PEP 574)
+            cache = {"index": self._index, "vecs": self._vecs[:self._size], "normalized": True}
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, CACHE_PATH)
+        if os.path.exists(CACHE_LOG_PATH):
+            os.remove(CACHE_LOG_PATH)
+
+    def _append_log(self, hashes: List[bytes], vecs: np.ndarray):
+        """Persist one batch of new embeddings in O(batch) instead of rewriting the cache"""
+        os.makedirs(os.path.dirname(CACHE_LOG_PATH) or ".", exist_ok=True)
+        with open(CACHE_LOG_PATH, "ab") as f:
+            pickle.dump((hashes, vecs), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _append_rows(self, vecs: np.ndarray) -> int:
+        """Copy new vectors into the cache matrix, growing it geometrically; returns the first row"""
+        start, needed = self._size, self._size + len(vecs)
+        if self._vecs is None:
+            self._vecs = np.empty((needed, vecs.shape[1]), dtype=np.float32)
+        elif needed > len(self._vecs):
+            grown = np.empty((max(needed, 2 * len(self._vecs)), self._vecs.shape[1]), dtype=np.float32)
+            grown[:start] = self._vecs[:start]
+            self._vecs = grown
+        self._vecs[start:needed] = vecs
+        self._size = needed
+        return start
 
     def _init_hf(self):
-        # Lazy load model
+        # Lazy load model (shared across instances)
         if self.hf_model is None:
-            self.hf_model = SentenceTransformer(HF_MODEL)
+            self.hf_model = _get_hf_model()
 
-    def embed(self, texts: List[str]) -> List[np.ndarray]:
+    def embed(self, texts: List[str]) -> np.ndarray:
         """
         Embed a list of texts. Uses cache for previously seen texts. New texts are embedded
-        with the local HF model and added to cache. Returns numpy.float32 vectors.
+        with the local HF model and added to cache. Returns one float32 row per text.
         """
-        results = []
-        to_embed = []
-        missing_indexes = []
-
-        for i, t in enumerate(texts):
-            h = self._hash(t)
-            if h in self.cache:
-                vec = np.array(self.cache[h], dtype=np.float32)
-                results.append(vec)
-            else:
-                results.append(None)
-                to_embed.append(t)
-                missing_indexes.append(i)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        hashes = self._hash_all(texts)
+        lookup = self._index.get
+        rows = [lookup(h) for h in hashes]
+        missing_indexes = [i for i, row in enumerate(rows) if row is None]
 
-        if to_embed:
+        if missing_indexes:
             if PROVIDER != "local":
                 # If you later want Gemini fallback, insert call here.
                 # For now, do local embeddings only to avoid Gemini quota.
                 raise RuntimeError("Non-local providers are not enabled. Set EMBEDDING_PROVIDER=local")
 
+            to_embed = [texts[i] for i in missing_indexes]
             self._init_hf()
-            vecs = self.hf_model.encode(to_embed, convert_to_numpy=True, show_progress_bar=False)
-            if isinstance(vecs, np.ndarray) is False:
-                vecs = np.array(vecs)
+            use_bf16 = EMBED_CPU_BF16 and self.hf_model.device.type == "cpu"
+            autocast = torch.autocast("cpu", dtype=torch.bfloat16) if use_bf16 else contextlib.nullcontext()
+            use_pool = (self.hf_model.device.type == "cpu" and not use_bf16 and
+                        EMBED_POOL_WORKERS > 1 and len(to_embed) >= EMBED_POOL_THRESHOLD)
+            if use_pool:
+                # Large CPU batch: fan out across processes (small ones aren't worth the IPC)
+                vecs = self.hf_model.encode_multi_process(to_embed, _get_hf_pool(), batch_size=EMBED_BATCH_SIZE)
+                vecs = _l2_normalize(np.asarray(vecs, dtype=np.float32))
+            else:
+                # Many short texts per pass, few long ones, each pass within the token budget
+                vecs = np.empty((len(to_embed), self.hf_model.get_sentence_embedding_dimension()),
+                                dtype=np.float32)
+                for batch in _token_budget_batches(to_embed, self.hf_model.max_seq_length):
+                    with torch.inference_mode(), autocast:
+                        out = self.hf_model.encode([to_embed[i] for i in batch], batch_size=len(batch),
+                                                   convert_to_tensor=True, normalize_embeddings=True,
+                                                   show_progress_bar=False)
+                    # Upcast half/bfloat16 outputs on the device; numpy has no bfloat16
+                    vecs[batch] = out.float().cpu().numpy()
 
-            for idx, vec in zip(missing_indexes, vecs):
-                vec = np.array(vec, dtype=np.float32)
-                results[idx] = vec
-                self.cache[self._hash(texts[idx])] = vec.tolist()
+            # Assign all new rows in one shot, then record where they landed
+            start = self._append_rows(vecs)
+            for offset, idx in enumerate(missing_indexes):
+                rows[idx] = start + offset
+                self._index[hashes[idx]] = start + offset
 
-            self._save_cache()
+            self._append_log([hashes[idx] for idx in missing_indexes], vecs)
 
-        return results
+        # One fancy-index gather fills the output matrix for hits and new rows alike
+        return self._vecs[rows]
@@ -0,0 +1,76 @@
+"""
+Extracted Text Cache
+Persists extracted document text on disk so unchanged files skip re-extraction
+"""
+
+import os
+import logging
+import pickle
+from pathlib import Path
+from typing import Iterable, Optional
+
+import xxhash
+
+logger = logging.getLogger(__name__)
+
+class ExtractCache:
+    """On-disk cache of extracted text keyed by (file path, size, mtime)
+
+    Each entry is its own pickle file named <path hash>_<size>_<mtime_ns>.pkl, so
+    worker processes can read and write concurrently without a shared index.
+    """
+
+    def __init__(self, cache_dir: str = "./.cache/extract"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path_key(self, file_path: str) -> str:
+        return xxhash.xxh3_64_hexdigest(os.path.abspath(file_path).encode('utf-8'))
+
+    def _entry_path(self, file_path: str) -> Path:
+        stats = os.stat(file_path)
+        return self.cache_dir / f"{self._path_key(file_path)}_{stats.st_size}_{stats.st_mtime_ns}.pkl"
+
+    def get(self, file_path: str) -> Optional[str]:
+        """Return cached text for the file as it is now on disk, or None"""
+        try:
+            with open(self._entry_path(file_path), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable extract cache entry for {file_path}: {e}")
+            return None
+
+    def put(self, file_path: str, text: str):
+        """Store extracted text, replacing entries for older versions of the file"""
+        try:
+            entry = self._entry_path(file_path)
+            for stale in self.cache_dir.glob(f"{self._path_key(file_path)}_*.pkl"):
+                if stale != entry:
+                    stale.unlink(missing_ok=True)
+
+            # Write to a private temp file, then rename so readers never see partial entries
+            tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, 'wb') as f:
+                pickle.dump(text, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry)
+        except Exception as e:
+            logger.warning(f"Could not cache extracted text for {file_path}: {e}")
+
+    def discard(self, file_path: str):
+        """Drop every cached version of a file"""
+        for entry in self.cache_dir.glob(f"{self._path_key(file_path)}_*.pkl"):
+            entry.unlink(missing_ok=True)
+
+    def prune(self, live_paths: Iterable[str]) -> int:
+        """Remove entries for files not in live_paths; returns how many were removed"""
+        live_keys = {self._path_key(path) for path in live_paths}
+        removed = 0
+        for entry in self.cache_dir.glob("*.pkl"):
+            if entry.name.split("_", 1)[0] not in live_keys:
+                entry.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} stale extract cache entries")
+        return removed
@@ -4,9 +4,10 @@ Handles Gemini LLM provider and conversation memory
 """
 
 import os
+import json
 import logging
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 # LangChain imports
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -18,6 +19,8 @@ from langchain.callbacks.manager import CallbackManagerForChainRun
 
 logger = logging.getLogger(__name__)
 
+_JSON_DECODER = json.JSONDecoder()
+
 class LLMManager:
     """Manages LLM operations and conversation memory"""
     
@@ -43,6 +46,11 @@ class LLMManager:
             return_messages=True,
             output_key="text"
         )
+        
+        # Default-prompt chains, built once and reused by every call
+        self._qa_chain = self.create_qa_chain(None)
+        self._summary_chain = self.create_summarization_chain()
+        self._quiz_chain = self.create_quiz_chain()
     
     def _initialize_llm(self):
         """Initialize LLM based on provider"""
@@ -146,18 +154,36 @@ class LLMManager:
     def answer_question(self, question: str, context: str) -> str:
         """Answer a question using provided context"""
         try:
-            qa_chain = self.create_qa_chain(None)
-            result = qa_chain.run(input=f"Context: {context}\n\nQuestion: {question}")
+            result = self._qa_chain.run(input=f"Context: {context}\n\nQuestion: {question}")
             return result
         except Exception as e:
             logger.error(f"Error answering question: {e}")
             raise
     
+    def answer_questions(self, pairs: List[Tuple[str, str]], max_concurrency: int = 8) -> List[str]:
+        """Answer several (question, context) pairs with concurrent LLM requests.
+        
+        Meant for grading / evaluation workloads: answers are returned in input order and
+        are not added to conversation memory.
+        """
+        try:
+            prompt = self._qa_chain.prompt
+            inputs = [prompt.format_messages(input=f"Context: {context}\n\nQuestion: {question}")
+                      for question, context in pairs]
+            if len(inputs) == 1:
+                # Nothing to run concurrently; skip batch's executor. Not answer_question -
+                # that goes through the QA chain and would write this answer to memory
+                return [self.llm.invoke(inputs[0]).content]
+            responses = self.llm.batch(inputs, config={"max_concurrency": max_concurrency})
+            return [response.content for response in responses]
+        except Exception as e:
+            logger.error(f"Error answering questions: {e}")
+            raise
+    
     def summarize_text(self, text: str) -> str:
         """Summarize provided text"""
         try:
-            summary_chain = self.create_summarization_chain()
-            result = summary_chain.run(text=text)
+            result = self._summary_chain.run(text=text)
             return result
         except Exception as e:
             logger.error(f"Error summarizing text: {e}")
@@ -166,24 +192,14 @@ class LLMManager:
     def generate_quiz(self, text: str, num_questions: int = 5) -> Dict[str, Any]:
         """Generate quiz questions from text"""
         try:
-            quiz_chain = self.create_quiz_chain()
-            result = quiz_chain.run(text=text, num_questions=num_questions)
-            
-            # Try to parse JSON response
-            import json
-            import re
-            
-            # Extract JSON from markdown code blocks if present
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', result, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                json_str = result
+            result = self._quiz_chain.run(text=text, num_questions=num_questions)
             
+            # Decode the first JSON object in the reply (bare or inside a ```json fence)
+            # in one pass; raw_decode stops at the object's end, ignoring trailing text
             try:
-                parsed = json.loads(json_str)
+                parsed, _ = _JSON_DECODER.raw_decode(result, result.index('{'))
                 return parsed
-            except json.JSONDecodeError:
+            except ValueError:
                 # If not valid JSON, return as text
                 return {"questions": [{"type": "text", "content": result}]}
                 
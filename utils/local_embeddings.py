@@ -14,10 +14,18 @@ class LocalEmbeddings(Embeddings):
     def __init__(self):
         self.embedding_service = EmbeddingService()
     
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents as one (len(texts), dim) float32 matrix"""
+        return self.embedding_service.embed(texts)
+    
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents"""
-        vectors = self.embedding_service.embed(texts)
-        return [vector.tolist() for vector in vectors]
+        # One C-level tolist() over the matrix; LangChain/Chroma expect plain lists here
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_queries_np(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries as one matrix (the model treats queries and documents alike)"""
+        return self.embedding_service.embed(texts)
     
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query"""
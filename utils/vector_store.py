@@ -4,11 +4,20 @@ Handles FAISS and Chroma vector databases with Gemini embeddings and enhanced do
 """
 
 import os
+import atexit
 import logging
 import json
+import pickle
 import shutil
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Hashable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from pathlib import Path
 
 # Vector database imports
@@ -21,60 +30,265 @@ from chromadb.config import Settings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from .local_embeddings import LocalEmbeddings
 from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.vectorstores import FAISS, Chroma
+from langchain.vectorstores.utils import DistanceStrategy
 
 logger = logging.getLogger(__name__)
 
+# Index choice for fresh FAISS builds by chunk count: exact flat search below
+# FAISS_HNSW_THRESHOLD, HNSW graph up to FAISS_IVF_THRESHOLD, IVF-PQ above that
+FAISS_HNSW_THRESHOLD = int(os.getenv("FAISS_HNSW_THRESHOLD", 10_000))
+FAISS_IVF_THRESHOLD = int(os.getenv("FAISS_IVF_THRESHOLD", 50_000))
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 200
+FAISS_HNSW_EF_SEARCH = 64
+FAISS_IVF_NPROBE = 16
+# Scalar quantization for flat/HNSW vectors: "fp16" halves memory and scan bandwidth,
+# "sq8" quarters it at a small recall cost, "none" keeps float32 (queries stay float32).
+# FAISS_FP16=false is still honoured as "none" when FAISS_QUANTIZATION is unset.
+FAISS_QUANTIZATION = os.getenv(
+    "FAISS_QUANTIZATION",
+    "fp16" if os.getenv("FAISS_FP16", "true").lower() == "true" else "none"
+).lower()
+_FAISS_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "none": None,
+}
+
+# Serve FAISS searches from GPU 0 when this faiss build has GPU support and a device is visible
+FAISS_USE_GPU = os.getenv("FAISS_USE_GPU", "1") == "1"
+FAISS_GPU_TEMP_MEMORY = 256 * 1024 * 1024
+
+# Rows per Chroma collection.add call (well under its SQLite bound-variable limit)
+CHROMA_ADD_BATCH_SIZE = 5000
+
+# Seconds of quiet after the last add before the store is written to disk
+VECTOR_STORE_SAVE_DEBOUNCE = float(os.getenv("VECTOR_STORE_SAVE_DEBOUNCE", 2.0))
+
+# Texts per Gemini embedding request (batchEmbedContents accepts at most 100)
+GEMINI_EMBED_BATCH_SIZE = int(os.getenv("GEMINI_EMBED_BATCH_SIZE", 100))
+# Embedding requests in flight at once; lower it to stay under the API quota
+GEMINI_EMBED_CONCURRENCY = max(1, int(os.getenv("GEMINI_EMBED_CONCURRENCY", 8)))
+
+# Let FAISS use every core for index builds and exact-search batches
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+def _link_or_copy(src, dst):
+    """Hard-link src to dst, replacing dst; copies instead where links are not possible.
+    
+    Only safe for files that are replaced rather than rewritten in place, which holds for
+    the FAISS index files and the metadata snapshot (both written via rename).
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return dst  # Already linked (renaming a link onto itself would be a no-op)
+    tmp = Path(f"{dst}.link_tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # Cross-device (EXDEV) or a filesystem without hard links
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return dst
+
+class _LazyEmbeddings(Embeddings):
+    """Defers building the real embeddings (API client or local model) until first use"""
+    
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._target: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def target(self) -> Embeddings:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.target.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.target.embed_query(text)
+    
+    def __getattr__(self, name):
+        # Optional fast paths of the wrapped embeddings (embed_documents_np, embed_queries_np)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.target, name)
+
+class _BatchingEmbeddings(Embeddings):
+    """Embeds documents through a remote client in request-sized groups, as one float32 matrix"""
+    
+    def __init__(self, client: Embeddings,
+                 batch_size: int = GEMINI_EMBED_BATCH_SIZE,
+                 max_workers: int = GEMINI_EMBED_CONCURRENCY):
+        self._client = client
+        self.batch_size = batch_size
+        # Requests are network-bound, so threads overlap their round trips; reused across calls
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+    
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """Embed texts with one request per batch_size group, sent concurrently"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        chunks = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(chunks) == 1:
+            results = [self._client.embed_documents(chunks[0])]
+        else:
+            # map() yields in submission order, so rows line up with texts
+            results = self._executor.map(self._client.embed_documents, chunks)
+        return np.concatenate([np.asarray(rows, dtype=np.float32) for rows in results])
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents_np(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._client.embed_query(text)
+    
+    def embed_queries_np(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries concurrently (queries use their own task type, so no batching)"""
+        return np.asarray(list(self._executor.map(self._client.embed_query, texts)), dtype=np.float32)
+
 class VectorStoreManager:
     """Manages vector database operations with enhanced document management"""
     
+    # (tracked field, chunk metadata key, default) for documents_metadata entries
+    _METADATA_FIELDS = (
+        ('filename', 'filename', 'unknown'),
+        ('content_hash', 'content_hash', ''),
+        ('processing_timestamp', 'processing_timestamp', ''),
+        ('chunk_count', 'total_chunks', 1),
+        ('file_type', 'file_type', ''),
+        ('file_size', 'file_size', 0),
+    )
+    
     def __init__(self, 
                  vector_db_type: str = "faiss",
                  vector_db_path: str = "./data/vector_db",
                  embedding_model: str = "google",
-                 embedding_model_name: str = "models/embedding-001"):
+                 embedding_model_name: str = "models/embedding-001",
+                 faiss_quantization: str = FAISS_QUANTIZATION):
         
         self.vector_db_type = vector_db_type.lower()
+        if faiss_quantization.lower() not in _FAISS_SQ_TYPES:
+            raise ValueError(f"Unsupported FAISS quantization: {faiss_quantization}. "
+                             f"Supported: {', '.join(_FAISS_SQ_TYPES)}")
+        self.faiss_quantization = faiss_quantization.lower()
         self.vector_db_path = Path(vector_db_path)
         self.vector_db_path.mkdir(parents=True, exist_ok=True)
         
-        # Initialize embeddings
-        self.embeddings = self._initialize_embeddings(embedding_model, embedding_model_name)
+        # Embeddings are built on first use, so loading, stats and backup flows never pay for
+        # the API client or the local model
+        if embedding_model.lower() not in ("google", "local"):
+            raise ValueError(f"Unsupported embedding model: {embedding_model}. Supported: google, local")
+        # Local embeddings come out unit-length; anything else is L2-normalized for FAISS
+        self._local_embeddings = embedding_model.lower() == "local"
+        self.embeddings = _LazyEmbeddings(
+            lambda: self._initialize_embeddings(embedding_model, embedding_model_name)
+        )
+        
+        # Debounced persistence: add_documents schedules, flush() writes, exit flushes
+        self._save_lock = threading.RLock()
+        self._save_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
         
         # Initialize vector store
+        self._faiss_mmapped = False
+        self._gpu_resources = None
+        # FAISS metadata postings, built lazily per filtered key: key -> value -> index rows
+        self._meta_index: Dict[str, Dict[Any, set]] = {}
         self.vector_store = self._initialize_vector_store()
+        # Chunk count, computed lazily and kept current by add/clear; None means "ask the store"
+        self._doc_count: Optional[int] = None
         
         # Document management
         self.metadata_file = self.vector_db_path / "documents_metadata.json"
+        # Append-only [document_id, entry] lines written since the last full snapshot
+        self.metadata_log_file = self.vector_db_path / "documents_metadata.jsonl"
+        self._dirty_metadata_ids = set()
         self.documents_metadata = self._load_metadata()
+        self._recount_metadata()
+    
+    def _recount_metadata(self):
+        """Rebuild the per-filename / per-file-type counts behind get_store_stats"""
+        metas = self.documents_metadata.values()
+        self._filename_counts = Counter(meta['filename'] for meta in metas)
+        self._file_type_counts = Counter(meta.get('file_type', 'unknown') for meta in metas)
+    
+    def _count_metadata(self, meta: Dict[str, Any], delta: int):
+        """Add (delta=1) or remove (delta=-1) one entry from the stats counts"""
+        for counts, key in ((self._filename_counts, meta['filename']),
+                            (self._file_type_counts, meta.get('file_type', 'unknown'))):
+            counts[key] += delta
+            if counts[key] <= 0:
+                del counts[key]
     
     def _load_metadata(self) -> Dict[str, Any]:
-        """Load document metadata from file"""
+        """Load document metadata from file, folding in (and compacting) the append log"""
         try:
+            metadata = {}
             if self.metadata_file.exists():
                 with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+                    metadata = json.load(f)
+            
+            if self.metadata_log_file.exists():
+                with open(self.metadata_log_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            doc_id, entry = json.loads(line)
+                        except ValueError:
+                            # A torn final line from an interrupted write; keep what came before
+                            break
+                        metadata[doc_id] = entry
+                self.documents_metadata = metadata
+                self._save_metadata()
+            return metadata
         except Exception as e:
             logger.error(f"Error loading metadata: {e}")
             return {}
     
     def _save_metadata(self):
-        """Save document metadata to file"""
+        """Write a full metadata snapshot and drop the append log it now contains"""
         try:
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_metadata, f, indent=2, ensure_ascii=False)
+            tmp = self.metadata_file.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.documents_metadata, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.metadata_file)
+            self.metadata_log_file.unlink(missing_ok=True)
+            self._dirty_metadata_ids.clear()
         except Exception as e:
             logger.error(f"Error saving metadata: {e}")
     
+    def _append_metadata(self):
+        """Persist only the entries changed since the last write, in O(changed)"""
+        if not self._dirty_metadata_ids:
+            return
+        try:
+            lines = [
+                json.dumps([doc_id, self.documents_metadata[doc_id]], ensure_ascii=False) + "\n"
+                for doc_id in self._dirty_metadata_ids
+                if doc_id in self.documents_metadata
+            ]
+            with open(self.metadata_log_file, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            self._dirty_metadata_ids.clear()
+        except Exception as e:
+            logger.error(f"Error appending metadata: {e}")
+    
     
     def _initialize_embeddings(self, embedding_model: str, model_name: str):
         """Initialize embedding model"""
         if embedding_model.lower() == "google":
-            return GoogleGenerativeAIEmbeddings(
+            return _BatchingEmbeddings(GoogleGenerativeAIEmbeddings(
                 model=model_name,
                 google_api_key=os.getenv("GOOGLE_API_KEY")
-            )
+            ))
         elif embedding_model.lower() == "local":
             return LocalEmbeddings()
         else:
@@ -92,14 +306,66 @@ class VectorStoreManager:
     def _initialize_faiss(self):
         """Initialize FAISS vector store"""
         faiss_path = self.vector_db_path / "faiss_index"
+        self._meta_index = {}
         
         if faiss_path.exists():
-            logger.info("Loading existing FAISS index")
-            return FAISS.load_local(str(faiss_path), self.embeddings, allow_dangerous_deserialization=True)
+            index_file = str(faiss_path / "index.faiss")
+            try:
+                # Map the index read-only so pages load on demand and are shared across forks.
+                # faiss only keeps IVF inverted lists on disk this way - flat, SQ and HNSW
+                # indexes are read into memory regardless and are writable as loaded.
+                index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._faiss_mmapped = self._is_ivf(index)
+                logger.info("Loaded existing FAISS index "
+                            f"({'memory-mapped' if self._faiss_mmapped else 'in memory'})")
+            except RuntimeError as e:
+                logger.info(f"Memory-mapped FAISS load failed ({e}); reading index into memory")
+                index = faiss.read_index(index_file)
+                self._faiss_mmapped = False
+            with open(faiss_path / "index.pkl", "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            index = self._faiss_to_gpu(index)
+            return self._configure_faiss_store(
+                FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+            )
         else:
             logger.info("No existing FAISS index found - will create when documents are added")
             return None  # Return None instead of creating empty store
     
+    @staticmethod
+    def _is_ivf(index) -> bool:
+        """Whether the index is (or wraps) an IVF index"""
+        try:
+            faiss.extract_index_ivf(index)
+            return True
+        except RuntimeError:
+            return False
+    
+    def _ensure_writable_faiss(self):
+        """Replace a read-only memory-mapped IVF index with a fully loaded one"""
+        if self._faiss_mmapped and self.vector_store is not None:
+            faiss_path = self.vector_db_path / "faiss_index"
+            self.vector_store.index = faiss.read_index(str(faiss_path / "index.faiss"))
+        self._faiss_mmapped = False
+    
+    def _faiss_to_gpu(self, index):
+        """Copy a CPU index onto GPU 0 when one is available; otherwise return it unchanged"""
+        if not (FAISS_USE_GPU and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0):
+            return index
+        try:
+            if self._gpu_resources is None:
+                self._gpu_resources = faiss.StandardGpuResources()
+                self._gpu_resources.setTempMemory(FAISS_GPU_TEMP_MEMORY)
+            gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+        except Exception as e:
+            # HNSW and some quantizers have no GPU implementation
+            logger.info(f"Keeping FAISS index on CPU: {e}")
+            return index
+        # The GPU copy is independent of any memory-mapped file and writable
+        self._faiss_mmapped = False
+        logger.info("Moved FAISS index to GPU")
+        return gpu_index
+    
     def _initialize_chroma(self):
         """Initialize Chroma vector store"""
         chroma_path = self.vector_db_path / "chroma_db"
@@ -110,81 +376,289 @@ class VectorStoreManager:
             collection_name="study_documents"
         )
     
-    def add_documents(self, documents: List[Document]) -> None:
-        """Add documents to vector store with proper replacement logic"""
-        try:
-            if not documents:
-                logger.warning("No documents to add")
-                return
+    def _embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a float32 matrix, skipping the list round-trip when the embedder can"""
+        embed_np = getattr(self.embeddings, "embed_documents_np", None)
+        if embed_np is not None:
+            return embed_np(texts)
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+    
+    def _configure_faiss_store(self, store: FAISS) -> FAISS:
+        """Match the LangChain wrapper to the index metric (older stores on disk are L2)"""
+        if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            store.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+            # Local embeddings arrive unit-length; anything else is normalized on add/query
+            store._normalize_L2 = not self._local_embeddings
+        return store
+    
+    def _new_faiss_index(self, vectors: np.ndarray, total_hint: Optional[int] = None):
+        """Create and fill an inner-product FAISS index sized to the corpus (flat, HNSW or IVF-PQ).
+        
+        Vectors must be unit-length, so inner product is cosine similarity. total_hint is
+        the expected final size when more batches will follow; it picks HNSW up front and
+        reserves storage. IVF still needs the vectors in hand to train on.
+        """
+        count, dim = vectors.shape
+        expected = max(count, total_hint or 0)
+        metric = faiss.METRIC_INNER_PRODUCT
+        sq_type = _FAISS_SQ_TYPES[self.faiss_quantization]
+        codec_name = {"fp16": "SQfp16", "sq8": "SQ8", "none": "Flat"}[self.faiss_quantization]
+        if count >= FAISS_IVF_THRESHOLD:
+            # ~4*sqrt(n) inverted lists; PQ32 needs the dimension to split evenly into 32 sub-vectors
+            nlist = min(4096, int(4 * np.sqrt(count)))
+            codec = "PQ32" if dim % 32 == 0 else "Flat"
+            index = faiss.index_factory(dim, f"IVF{nlist},{codec}", metric)
+            index.train(vectors)
+            faiss.extract_index_ivf(index).nprobe = FAISS_IVF_NPROBE
+            description = f"IVF{nlist},{codec}"
+        elif expected >= FAISS_HNSW_THRESHOLD:
+            if sq_type is not None:
+                index = faiss.IndexHNSWSQ(dim, sq_type, FAISS_HNSW_M, metric)
+            else:
+                index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, metric)
+            index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+            description = f"HNSW{FAISS_HNSW_M},{codec_name}"
+        elif sq_type is not None:
+            index = faiss.IndexScalarQuantizer(dim, sq_type, metric)
+            description = codec_name
+        else:
+            index = faiss.IndexFlatIP(dim)
+            description = "Flat"
+        
+        if not index.is_trained:
+            index.train(vectors)
+        self._reserve_faiss(index, expected)
+        index.add(vectors)
+        logger.info(f"Built {description} FAISS index for {count} chunks")
+        return index
+    
+    @staticmethod
+    def _reserve_faiss(index, total: int):
+        """Reserve code storage for `total` vectors so adds up to it grow without reallocating"""
+        # HNSW keeps its vectors in a flat storage index; flat and SQ indexes hold them directly
+        storage = faiss.downcast_index(index.storage) if hasattr(index, "storage") else index
+        codes = getattr(storage, "codes", None)
+        if codes is None:
+            return  # IVF lists and GPU indexes manage their own storage
+        wanted = total * storage.code_size
+        if wanted > codes.size():
+            # faiss's SWIG vectors expose resize() but not reserve(); growing and shrinking back
+            # leaves std::vector's capacity at `wanted`, so later adds fill it in place
+            codes.resize(wanted)
+            codes.resize(storage.ntotal * storage.code_size)
+    
+    def _build_faiss_store(self, documents: List[Document], total_hint: Optional[int] = None) -> FAISS:
+        """Embed documents and wrap a corpus-sized FAISS index in a LangChain store"""
+        vectors = self._embed_matrix([doc.page_content for doc in documents])
+        if not self._local_embeddings:
+            faiss.normalize_L2(vectors)
+        index = self._faiss_to_gpu(self._new_faiss_index(vectors, total_hint))
+        self._faiss_mmapped = False
+        self._meta_index = {}
+        
+        ids = [str(uuid.uuid4()) for _ in documents]
+        return self._configure_faiss_store(FAISS(
+            self.embeddings,
+            index,
+            InMemoryDocstore(dict(zip(ids, documents))),
+            dict(enumerate(ids))
+        ))
+    
+    def _faiss_add_raw(self, documents: List[Document]) -> None:
+        """Append documents to the existing FAISS store in place.
+        
+        Embeds the batch once into a single matrix, adds it to the index and extends the
+        docstore / id map directly - no temporary store, per-row copies or merge.
+        """
+        store = self.vector_store
+        vectors = self._embed_matrix([doc.page_content for doc in documents])
+        if store._normalize_L2:
+            faiss.normalize_L2(vectors)
+        
+        start = store.index.ntotal
+        store.index.add(vectors)
+        ids = [str(uuid.uuid4()) for _ in documents]
+        store.docstore.add(dict(zip(ids, documents)))
+        store.index_to_docstore_id.update(zip(range(start, start + len(ids)), ids))
+        for key, postings in self._meta_index.items():
+            for row, doc in enumerate(documents, start):
+                self._post_metadata(postings, key, row, doc)
+    
+    def _chroma_add_raw(self, documents: List[Document]) -> None:
+        """Embed documents once and insert them with a few bulk collection.add calls"""
+        texts = [doc.page_content for doc in documents]
+        vectors = self._embed_matrix(texts)
+        collection = self.vector_store._collection
+        for start in range(0, len(documents), CHROMA_ADD_BATCH_SIZE):
+            end = start + CHROMA_ADD_BATCH_SIZE
+            batch = documents[start:end]
+            collection.add(
+                ids=[str(uuid.uuid4()) for _ in batch],
+                # Lists only at the API boundary; the matrix is built once
+                embeddings=vectors[start:end].tolist(),
+                documents=texts[start:end],
+                metadatas=[doc.metadata for doc in batch]
+            )
+    
+    def add_documents(self, documents: List[Document], persist: bool = True,
+                      total_hint: Optional[int] = None) -> None:
+        """Add documents to vector store with proper replacement logic.
+        
+        With persist=True the write to disk is debounced (see _schedule_save); with
+        persist=False nothing is written - call save() once after a bulk load.
+        total_hint is the store size expected once a multi-batch load finishes; FAISS
+        reserves room for it up front instead of regrowing on every batch.
+        """
+        # Held across the mutation so a debounced save never writes a half-added batch
+        with self._save_lock:
+            try:
+                if not documents:
+                    logger.warning("No documents to add")
+                    return
                 
-            if self.vector_db_type == "faiss":
-                # For FAISS, always create fresh store if we don't have one or if explicitly replacing
-                if self.vector_store is None:
-                    logger.info("Creating new FAISS store")
-                    self.vector_store = FAISS.from_documents(documents, self.embeddings)
-                else:
-                    # Check if we should merge or replace based on existing document count
+                if self.vector_db_type == "faiss":
+                    # For FAISS, create a fresh store if we don't have one (or it's empty)
                     current_count = self.get_document_count()
                     if current_count == 0:
-                        # Empty store, create fresh
-                        logger.info("Creating fresh FAISS store (was empty)")
-                        self.vector_store = FAISS.from_documents(documents, self.embeddings)
+                        logger.info("Creating new FAISS store")
+                        self.vector_store = self._build_faiss_store(documents, total_hint)
                     else:
-                        # Merge with existing
-                        logger.info(f"Merging {len(documents)} documents with existing {current_count}")
-                        new_store = FAISS.from_documents(documents, self.embeddings)
+                        # Embed just the new batch and append it to the existing index
+                        logger.info(f"Adding {len(documents)} documents to existing {current_count}")
+                        self._ensure_writable_faiss()
+                        if total_hint and total_hint > current_count + len(documents):
+                            self._reserve_faiss(self.vector_store.index, total_hint)
                         try:
-                            self.vector_store.merge_from(new_store)
-                        except Exception as merge_error:
-                            logger.warning(f"Merge failed (likely dimension mismatch): {merge_error}")
+                            self._faiss_add_raw(documents)
+                        except Exception as add_error:
+                            logger.warning(f"Add failed (likely dimension mismatch): {add_error}")
                             logger.info("Creating fresh FAISS store due to dimension mismatch")
-                            self.vector_store = FAISS.from_documents(documents, self.embeddings)
+                            self.vector_store = self._build_faiss_store(documents)
                 
-                # Save FAISS index
-                faiss_path = self.vector_db_path / "faiss_index"
-                self.vector_store.save_local(str(faiss_path))
+                elif self.vector_db_type == "chroma":
+                    self._chroma_add_raw(documents)
                 
-            elif self.vector_db_type == "chroma":
-                self.vector_store.add_documents(documents)
-            
-            # Update metadata tracking
-            self._update_documents_metadata(documents)
-            self._save_metadata()
-            
-            logger.info(f"Added {len(documents)} documents to vector store")
-            
-        except Exception as e:
-            logger.error(f"Error adding documents to vector store: {e}")
-            raise
+                if self.vector_db_type == "faiss":
+                    # Exact even when the add fell back to a rebuild
+                    self._doc_count = self.vector_store.index.ntotal
+                    if total_hint:
+                        logger.info(f"FAISS holds {self._doc_count} of {total_hint} expected vectors")
+                elif self._doc_count is not None:
+                    self._doc_count += len(documents)
+                
+                # Update metadata tracking
+                self._update_documents_metadata(documents)
+                if persist:
+                    self._schedule_save()
+                
+                logger.info(f"Added {len(documents)} documents to vector store")
+                
+            except Exception as e:
+                logger.error(f"Error adding documents to vector store: {e}")
+                self._doc_count = None
+                raise
+    
+    def _schedule_save(self):
+        """(Re)start the debounce timer so a burst of adds ends in a single save"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(VECTOR_STORE_SAVE_DEBOUNCE, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def _cancel_save(self):
+        """Drop a pending debounced save (the state it would write is being discarded)"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+    
+    def flush(self):
+        """Write any pending debounced save to disk now"""
+        with self._save_lock:
+            if self._save_timer is None:
+                return
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Error saving vector store: {e}")
+    
+    def save(self):
+        """Write the FAISS index (Chroma persists itself) and document metadata to disk"""
+        with self._save_lock:
+            # Covers anything a pending debounced save would have written
+            self._cancel_save()
+            if self.vector_db_type == "faiss" and self.vector_store is not None:
+                faiss_path = self.vector_db_path / "faiss_index"
+                new_path = faiss_path.with_name("faiss_index.new")
+                if new_path.exists():
+                    shutil.rmtree(new_path)
+                index = self.vector_store.index
+                if hasattr(index, "getDevice"):
+                    # GPU indexes cannot be serialized directly; write a CPU copy
+                    self.vector_store.index = faiss.index_gpu_to_cpu(index)
+                try:
+                    self.vector_store.save_local(str(new_path))
+                finally:
+                    self.vector_store.index = index
+                self._atomic_replace_index_dir(new_path, faiss_path)
+            self._append_metadata()
+    
+    def _atomic_replace_index_dir(self, new_dir: Path, target: Path):
+        """Rename a fully written directory into place, retiring the previous one.
+        
+        Readers never see a half-written index, and files still memory-mapped from the
+        old directory stay valid because they are unlinked, not overwritten.
+        """
+        if target.exists():
+            self._retire_dir(target)
+        os.replace(new_dir, target)
+    
+    def _retire_dir(self, path: Path):
+        """Rename a directory out of the way (O(1)) and delete it on a background thread"""
+        tombstone = path.with_name(f"{path.name}.old_{time.time_ns()}")
+        os.replace(path, tombstone)
+        # Also sweep tombstones left behind by an earlier process that exited mid-delete
+        stale = list(path.parent.glob(f"{path.name}.old_*"))
+        threading.Thread(
+            target=lambda: [shutil.rmtree(p, ignore_errors=True) for p in stale],
+            daemon=True
+        ).start()
     
     def _update_documents_metadata(self, documents: List[Document]):
         """Update internal metadata tracking"""
-        for doc in documents:
-            if 'document_id' in doc.metadata:
-                doc_id = doc.metadata['document_id']
-                self.documents_metadata[doc_id] = {
-                    'filename': doc.metadata.get('filename', 'unknown'),
-                    'content_hash': doc.metadata.get('content_hash', ''),
-                    'processing_timestamp': doc.metadata.get('processing_timestamp', ''),
-                    'chunk_count': doc.metadata.get('total_chunks', 1),
-                    'file_type': doc.metadata.get('file_type', ''),
-                    'file_size': doc.metadata.get('file_size', 0)
-                }
+        # Chunks of one document share these fields; keep the last chunk's metadata per
+        # document (as overwriting per chunk did) and build each entry once
+        latest = {doc.metadata['document_id']: doc.metadata
+                  for doc in documents if 'document_id' in doc.metadata}
+        for doc_id, md in latest.items():
+            previous = self.documents_metadata.get(doc_id)
+            if previous is not None:
+                self._count_metadata(previous, -1)
+            meta = self.documents_metadata[doc_id] = {
+                field: md.get(key, default) for field, key, default in self._METADATA_FIELDS
+            }
+            self._count_metadata(meta, 1)
+        self._dirty_metadata_ids.update(latest)
     
     def clear_all_documents(self) -> bool:
         """Clear all documents from vector store and completely reset memory"""
         try:
             logger.info("Completely clearing all documents from vector store")
+            self._cancel_save()
             
             if self.vector_db_type == "faiss":
                 # Remove FAISS index files completely
                 faiss_path = self.vector_db_path / "faiss_index"
                 if faiss_path.exists():
-                    shutil.rmtree(faiss_path)
+                    self._retire_dir(faiss_path)
                     logger.info("Removed FAISS index files")
                 
                 # Set vector store to None (no empty placeholder)
                 self.vector_store = None
+                self._meta_index = {}
                 logger.info("Reset FAISS vector store to empty state")
                 
             elif self.vector_db_type == "chroma":
@@ -197,8 +671,11 @@ class VectorStoreManager:
                 # Reinitialize Chroma
                 self.vector_store = self._initialize_chroma()
             
+            self._doc_count = 0
+            
             # Clear metadata completely
             self.documents_metadata.clear()
+            self._recount_metadata()
             self._save_metadata()
             
             logger.info("Successfully cleared all documents and reset memory completely")
@@ -228,13 +705,44 @@ class VectorStoreManager:
             logger.error(f"Error replacing documents: {e}")
             return False
     
+    @staticmethod
+    def _post_metadata(postings: Dict[Any, set], key: str, row: int, doc: Document):
+        """Record that index row `row` carries doc.metadata[key]"""
+        if key in doc.metadata:
+            try:
+                postings.setdefault(doc.metadata[key], set()).add(row)
+            except TypeError:
+                pass  # Unhashable values are only matched by the full scan
+    
+    def _metadata_postings(self, key: str) -> Dict[Any, set]:
+        """Postings for one metadata key, swept from the docstore on first use"""
+        postings = self._meta_index.get(key)
+        if postings is None:
+            postings = self._meta_index[key] = {}
+            docs_by_id = self.vector_store.docstore._dict
+            for row, doc_id in self.vector_store.index_to_docstore_id.items():
+                self._post_metadata(postings, key, row, docs_by_id[doc_id])
+        return postings
+    
     def get_documents_by_metadata(self, filter_criteria: Dict[str, Any]) -> List[Document]:
         """Get documents that match specific metadata criteria"""
         try:
-            all_docs = self.get_all_documents()
+            if (self.vector_db_type == "faiss" and self.vector_store is not None and filter_criteria
+                    and all(isinstance(v, Hashable) for v in filter_criteria.values())):
+                # Intersect per-key postings instead of scanning every chunk
+                rows = set.intersection(*(
+                    self._metadata_postings(key).get(value, set())
+                    for key, value in filter_criteria.items()
+                ))
+                docs_by_id = self.vector_store.docstore._dict
+                id_map = self.vector_store.index_to_docstore_id
+                filtered_docs = [docs_by_id[id_map[row]] for row in sorted(rows)]
+                logger.info(f"Found {len(filtered_docs)} documents matching criteria")
+                return filtered_docs
+            
             filtered_docs = []
             
-            for doc in all_docs:
+            for doc in self.iter_documents():
                 match = True
                 for key, value in filter_criteria.items():
                     if key not in doc.metadata or doc.metadata[key] != value:
@@ -274,27 +782,35 @@ class VectorStoreManager:
             return 0
     
     def create_backup(self, backup_name: Optional[str] = None) -> str:
-        """Create backup of current vector store"""
+        """Create backup of current vector store.
+        
+        FAISS and metadata files are hard-linked rather than copied (Chroma's are copied,
+        since it rewrites its files in place), so a backup costs no extra disk space.
+        """
         try:
             if backup_name is None:
                 backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
             backup_path = self.vector_db_path / "backups" / backup_name
             backup_path.mkdir(parents=True, exist_ok=True)
+            self.flush()
             
             # Copy vector store files
             if self.vector_db_type == "faiss":
                 faiss_path = self.vector_db_path / "faiss_index"
                 if faiss_path.exists():
-                    shutil.copytree(faiss_path, backup_path / "faiss_index", dirs_exist_ok=True)
+                    # Hard-linked snapshot: saves write a new directory, never these files
+                    shutil.copytree(faiss_path, backup_path / "faiss_index",
+                                    copy_function=_link_or_copy, dirs_exist_ok=True)
             elif self.vector_db_type == "chroma":
                 chroma_path = self.vector_db_path / "chroma_db"
                 if chroma_path.exists():
                     shutil.copytree(chroma_path, backup_path / "chroma_db", dirs_exist_ok=True)
             
-            # Copy metadata
+            # Copy metadata (compacted first, so the snapshot holds every entry)
+            self._save_metadata()
             if self.metadata_file.exists():
-                shutil.copy2(self.metadata_file, backup_path / "documents_metadata.json")
+                _link_or_copy(self.metadata_file, backup_path / "documents_metadata.json")
             
             logger.info(f"Created backup: {backup_name}")
             return backup_name
@@ -320,7 +836,8 @@ class VectorStoreManager:
                 backup_faiss = backup_path / "faiss_index"
                 if backup_faiss.exists():
                     target_path = self.vector_db_path / "faiss_index"
-                    shutil.copytree(backup_faiss, target_path, dirs_exist_ok=True)
+                    shutil.copytree(backup_faiss, target_path,
+                                    copy_function=_link_or_copy, dirs_exist_ok=True)
                     # Reload FAISS store
                     self.vector_store = self._initialize_faiss()
                     
@@ -331,12 +848,14 @@ class VectorStoreManager:
                     shutil.copytree(backup_chroma, target_path, dirs_exist_ok=True)
                     # Reload Chroma store
                     self.vector_store = self._initialize_chroma()
+            self._doc_count = None
             
             # Restore metadata
             backup_metadata = backup_path / "documents_metadata.json"
             if backup_metadata.exists():
-                shutil.copy2(backup_metadata, self.metadata_file)
+                _link_or_copy(backup_metadata, self.metadata_file)
                 self.documents_metadata = self._load_metadata()
+                self._recount_metadata()
             
             logger.info(f"Restored backup: {backup_name}")
             return True
@@ -352,27 +871,30 @@ class VectorStoreManager:
                 'vector_db_type': self.vector_db_type,
                 'total_documents': self.get_document_count(),
                 'metadata_tracked_docs': len(self.documents_metadata),
-                'unique_files': len(set(doc['filename'] for doc in self.documents_metadata.values())),
+                'unique_files': len(self._filename_counts),
                 'storage_path': str(self.vector_db_path),
-                'last_update': datetime.now().isoformat()
+                'last_update': datetime.now().isoformat(),
+                # File type breakdown, maintained incrementally by _update_documents_metadata
+                'file_types': dict(self._file_type_counts)
             }
             
-            # File type breakdown
-            file_types = {}
-            for doc_meta in self.documents_metadata.values():
-                file_type = doc_meta.get('file_type', 'unknown')
-                file_types[file_type] = file_types.get(file_type, 0) + 1
-            stats['file_types'] = file_types
-            
             return stats
             
         except Exception as e:
             logger.error(f"Error getting store stats: {e}")
             return {'error': str(e)}
     
+    @staticmethod
+    def _is_blank_query(query: str) -> bool:
+        """Blank queries carry no signal but still cost an embedding call (a billed RTT for Gemini)"""
+        return not query or not query.strip()
+    
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
         """Search for similar documents"""
         try:
+            if self._is_blank_query(query):
+                logger.warning("Refusing similarity search for an empty query; use iter_documents() to list documents")
+                return []
             if self.vector_store is None:
                 logger.warning("No vector store available for search")
                 return []
@@ -384,9 +906,53 @@ class VectorStoreManager:
             logger.error(f"Error in similarity search: {e}")
             return []
     
+    def similarity_search_batch(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """Search for several queries at once; returns one result list per query.
+        
+        FAISS embeds the queries as one matrix and runs a single index.search over it;
+        Chroma falls back to one search per query.
+        """
+        try:
+            results = [[] for _ in queries]
+            # Blank queries get empty results without being embedded
+            live = [i for i, query in enumerate(queries) if not self._is_blank_query(query)]
+            if len(live) < len(queries):
+                logger.warning(f"Skipping {len(queries) - len(live)} empty queries in batched search")
+            if self.vector_store is None or not live:
+                return results
+            live_queries = [queries[i] for i in live]
+            if self.vector_db_type != "faiss":
+                for i, query in zip(live, live_queries):
+                    results[i] = self.vector_store.similarity_search(query, k=k)
+                return results
+            
+            embed_np = getattr(self.embeddings, "embed_queries_np", None)
+            if embed_np is not None:
+                query_vectors = np.ascontiguousarray(embed_np(live_queries), dtype=np.float32)
+            else:
+                query_vectors = np.asarray([self.embeddings.embed_query(q) for q in live_queries],
+                                           dtype=np.float32)
+            if self.vector_store._normalize_L2:
+                faiss.normalize_L2(query_vectors)
+            
+            _, rows = self.vector_store.index.search(query_vectors, k)
+            docs_by_id = self.vector_store.docstore._dict
+            id_map = self.vector_store.index_to_docstore_id
+            # -1 marks an empty slot when the index holds fewer than k vectors
+            for i, row in zip(live, rows.tolist()):
+                results[i] = [docs_by_id[id_map[j]] for j in row if j != -1]
+            logger.info(f"Ran batched similarity search for {len(live)} queries")
+            return results
+        except Exception as e:
+            logger.error(f"Error in batched similarity search: {e}")
+            return [[] for _ in queries]
+    
     def similarity_search_with_score(self, query: str, k: int = 4) -> List[tuple]:
         """Search for similar documents with scores"""
         try:
+            if self._is_blank_query(query):
+                logger.warning("Refusing similarity search for an empty query")
+                return []
             results = self.vector_store.similarity_search_with_score(query, k=k)
             logger.info(f"Found {len(results)} similar documents with scores")
             return results
@@ -409,6 +975,7 @@ class VectorStoreManager:
         try:
             if self.vector_db_type == "chroma":
                 self.vector_store.delete(ids)
+                self._doc_count = None
                 logger.info(f"Deleted {len(ids)} documents from vector store")
             else:
                 logger.warning("Document deletion not supported for FAISS")
@@ -418,46 +985,47 @@ class VectorStoreManager:
     
     def get_document_count(self) -> int:
         """Get total number of documents in vector store"""
+        if self._doc_count is not None:
+            return self._doc_count
         try:
             if self.vector_db_type == "faiss":
-                if self.vector_store is None:
-                    return 0
-                return self.vector_store.index.ntotal
+                count = self.vector_store.index.ntotal if self.vector_store is not None else 0
             elif self.vector_db_type == "chroma":
-                return self.vector_store._collection.count()
-            return 0
+                # A SQLite query, so only on first use or after deletes/restores
+                count = self.vector_store._collection.count()
+            else:
+                return 0
+            self._doc_count = count
+            return count
         except Exception as e:
             logger.error(f"Error getting document count: {e}")
             return 0
 
-    def get_all_documents(self) -> List[Document]:
-        """Get all documents from vector store"""
+    def iter_documents(self, limit: Optional[int] = None) -> Iterator[Document]:
+        """Yield stored documents (optionally only the first `limit`) without building a list"""
+        if self.vector_db_type == "faiss":
+            if self.vector_store is None:
+                return
+            
+            # Read straight from the docstore, in index order - no query embedding or search
+            docs_by_id = self.vector_store.docstore._dict
+            ids = self.vector_store.index_to_docstore_id.values()
+            if limit is not None:
+                ids = itertools.islice(ids, limit)
+            for doc_id in ids:
+                yield docs_by_id[doc_id]
+            
+        elif self.vector_db_type == "chroma":
+            # Documents and metadata only - Chroma skips returning the embeddings
+            results = self.vector_store.get(limit=limit, include=["documents", "metadatas"])
+            metadatas = results['metadatas'] or itertools.repeat({})
+            for content, metadata in zip(results['documents'], metadatas):
+                yield Document(page_content=content, metadata=metadata or {})
+    
+    def get_all_documents(self, limit: Optional[int] = None) -> List[Document]:
+        """Get all documents from vector store (optionally only the first `limit`)"""
         try:
-            if self.vector_db_type == "faiss":
-                if self.vector_store is None:
-                    return []
-                
-                # For FAISS, we need to search with a broad query to get all documents
-                document_count = self.get_document_count()
-                if document_count == 0:
-                    return []
-                
-                # Use a broad search to get all documents
-                results = self.vector_store.similarity_search("", k=document_count)
-                return results
-                
-            elif self.vector_db_type == "chroma":
-                # For Chroma, we can get all documents
-                results = self.vector_store.get()
-                documents = []
-                for i, content in enumerate(results['documents']):
-                    doc = Document(
-                        page_content=content,
-                        metadata=results['metadatas'][i] if results['metadatas'] else {}
-                    )
-                    documents.append(doc)
-                return documents
-            return []
+            return list(self.iter_documents(limit))
         except Exception as e:
             logger.error(f"Error getting all documents: {e}")
             return []